@@ -0,0 +1,62 @@
+"""Потоковая сериализация записей и комментариев в JSON.
+
+Страница отдаётся кусками: открывающая скобка, по объекту на кусок и
+хвост с курсорами, поэтому ответ целиком в памяти не собирается.
+Клиент может запросить только нужные поля: `?fields=id,text,author`.
+"""
+import json
+
+
+def _author(user):
+    return {'username': user.username, 'full_name': user.get_full_name()}
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: _author(post.author),
+    'group': lambda post: post.group_id and {
+        'slug': post.group.slug, 'title': post.group.title
+    },
+    'image': lambda post: post.image.url if post.image else None,
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created.isoformat(),
+    'author': lambda comment: _author(comment.author),
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def select_fields(request, available):
+    """Запрошенные в `?fields=` поля (в порядке `available`) или все."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(available)
+    names = {name.strip() for name in requested.split(',') if name.strip()}
+    unknown = names - set(available)
+    if unknown:
+        raise FieldsError(
+            'Неизвестные поля: ' + ', '.join(sorted(unknown))
+        )
+    return [name for name in available if name in names]
+
+
+def dump(obj, fields, available):
+    return json.dumps(
+        {name: available[name](obj) for name in fields}, ensure_ascii=False
+    )
+
+
+def stream_page(page, fields, available):
+    yield '{"results": ['
+    for index, obj in enumerate(page):
+        yield (',' if index else '') + dump(obj, fields, available)
+    yield '], "next": {}, "previous": {}}}'.format(
+        json.dumps(page.next_cursor), json.dumps(page.previous_cursor)
+    )
@@ -0,0 +1,116 @@
+import base64
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+from yatube.settings import POSTS_PER_PAGE
+
+USERNAME = 'author'
+GROUP_SLUG = 'test_group'
+POST_TEXT = 'Тестовый текст'
+INDEX_URL = reverse('api:index')
+GROUP_URL = reverse('api:group_posts', args=[GROUP_SLUG])
+PROFILE_URL = reverse('api:profile_posts', args=[USERNAME])
+
+
+def read(response):
+    content = (
+        b''.join(response.streaming_content) if response.streaming
+        else response.content
+    )
+    return json.loads(content)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username=USERNAME, first_name='Иван', last_name='Иванов'
+        )
+        cls.group = Group.objects.create(
+            slug=GROUP_SLUG, title='Группа', description='Описание'
+        )
+        Post.objects.bulk_create([
+            Post(text=f'{POST_TEXT} {i}', author=cls.user, group=cls.group)
+            for i in range(POSTS_PER_PAGE + 1)
+        ])
+        cls.post = Post.objects.first()
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds_use_cursor_pagination(self):
+        """Ленты листаются курсором и отдают автора и группу."""
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                first = read(self.client.get(url))
+                self.assertEqual(len(first['results']), POSTS_PER_PAGE)
+                self.assertEqual(first['results'][0]['id'], self.post.pk)
+                self.assertEqual(
+                    first['results'][0]['author']['full_name'], 'Иван Иванов'
+                )
+                self.assertEqual(
+                    first['results'][0]['group']['slug'], GROUP_SLUG
+                )
+                second = read(
+                    self.client.get(url, {'cursor': first['next']})
+                )
+                self.assertEqual(len(second['results']), 1)
+                self.assertIsNone(second['next'])
+
+    def test_malformed_cursor(self):
+        """Курсор с данными не того типа отдаёт первую страницу."""
+        cursor = base64.urlsafe_b64encode(b'["n", {}, 1]').decode()
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(read(response)['previous'])
+
+    def test_sparse_fields(self):
+        """Клиент получает только запрошенные поля."""
+        results = read(
+            self.client.get(INDEX_URL, {'fields': 'text,id', 'limit': 2})
+        )['results']
+        self.assertEqual(len(results), 2)
+        self.assertEqual(set(results[0]), {'id', 'text'})
+        response = self.client.get(INDEX_URL, {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_and_comments(self):
+        """Запись и её комментарии отдаются отдельными ресурсами."""
+        post = read(self.client.get(
+            reverse('api:post_detail', args=[self.post.pk])
+        ))
+        self.assertEqual(post['text'], self.post.text)
+        comments = read(self.client.get(
+            reverse('api:post_comments', args=[self.post.pk])
+        ))
+        self.assertEqual(
+            [comment['id'] for comment in comments['results']],
+            [self.comment.pk]
+        )
+        response = self.client.get(reverse('api:post_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_conditional_get_and_cache(self):
+        """API отвечает 304 на повторный запрос и кеширует ленту."""
+        response = self.client.get(INDEX_URL)
+        read(response)
+        self.assertEqual(
+            self.client.get(
+                INDEX_URL, HTTP_IF_NONE_MATCH=response['ETag']
+            ).status_code,
+            304
+        )
+        Post.objects.filter(pk=self.post.pk).update(text='Изменено')
+        cached = self.client.get(INDEX_URL)
+        self.assertFalse(cached.streaming)
+        self.assertEqual(read(cached)['results'][0]['text'], self.post.text)
@@ -0,0 +1,100 @@
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+
+from core.caching import versioned_cache_page
+from posts.conditional import (
+    conditional, group_scope, index_scope, post_scope, profile_scope
+)
+from posts.models import Comment, Group, Post, User
+from posts.pagination import CursorPaginator
+from yatube.settings import (
+    API_MAX_PAGE_SIZE, CACHE_TIME, COMMENTS_PER_PAGE, POSTS_PER_PAGE
+)
+from .serializers import (
+    COMMENT_FIELDS, POST_FIELDS, FieldsError, dump, select_fields,
+    stream_page
+)
+
+
+def error(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def page_size(request, default):
+    try:
+        size = int(request.GET.get('limit', default))
+    except ValueError:
+        return default
+    return max(1, min(size, API_MAX_PAGE_SIZE))
+
+
+def page_response(request, queryset, available, default_size, **options):
+    try:
+        fields = select_fields(request, available)
+    except FieldsError as fields_error:
+        return error(str(fields_error), 400)
+    page = CursorPaginator(
+        queryset, page_size(request, default_size), **options
+    ).cursor_page(request.GET.get('cursor'))
+    return StreamingHttpResponse(
+        stream_page(page, fields, available),
+        content_type='application/json'
+    )
+
+
+def posts_response(request, queryset):
+    return page_response(request, queryset, POST_FIELDS, POSTS_PER_PAGE)
+
+
+@conditional(index_scope)
+@versioned_cache_page(CACHE_TIME, 'index')
+def index(request):
+    return posts_response(request, Post.objects.for_cards())
+
+
+@conditional(group_scope)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).only('pk').first()
+    if group is None:
+        return error('Группа не найдена', 404)
+    return posts_response(request, group.posts.for_cards())
+
+
+@conditional(profile_scope)
+def profile_posts(request, username):
+    author = User.objects.filter(username=username).only('pk').first()
+    if author is None:
+        return error('Пользователь не найден', 404)
+    return posts_response(request, author.posts.for_cards())
+
+
+@conditional(post_scope)
+def post_detail(request, post_id):
+    try:
+        fields = select_fields(request, POST_FIELDS)
+    except FieldsError as fields_error:
+        return error(str(fields_error), 400)
+    post = Post.objects.for_cards().filter(pk=post_id).first()
+    if post is None:
+        return error('Запись не найдена', 404)
+    return HttpResponse(
+        dump(post, fields, POST_FIELDS), content_type='application/json'
+    )
+
+
+@conditional(post_scope)
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return error('Запись не найдена', 404)
+    return page_response(
+        request,
+        Comment.objects.filter(post_id=post_id).select_related(
+            'author'
+        ).only(
+            'text', 'created', 'author__username', 'author__first_name',
+            'author__last_name'
+        ),
+        COMMENT_FIELDS,
+        COMMENTS_PER_PAGE,
+        keys=('created', 'id'),
+        descending=False
+    )
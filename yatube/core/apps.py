@@ -1,5 +1,15 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import db, slow_queries
+        connection_created.connect(db.configure_connection)
+        connection_created.connect(slow_queries.install)
+        if settings.DATABASE_HEALTH_CHECKS:
+            request_started.connect(db.check_connections)
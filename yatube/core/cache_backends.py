@@ -0,0 +1,335 @@
+"""Бэкенды кеша, общие для всех процессов-воркеров.
+
+`SQLiteCache` — разделяемое хранилище в файле SQLite, локальная замена
+Redis. `TwoTierCache` ставит перед ним небольшой LRU в памяти процесса
+(L1) и сверяет его с общим хранилищем (L2) через счётчик поколений:
+удаление ключа, `incr`/`decr` и `clear` увеличивают поколение, и все
+процессы отбрасывают свой L1 при следующей сверке.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.functional import cached_property
+
+from . import metrics, stats
+
+MISSING = object()
+GENERATION_KEY = '__generation__'
+
+
+def _fresh_generation():
+    return int(time.time() * 1000)
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в файле SQLite (WAL), доступный всем процессам на машине."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    def _connection(self):
+        pid, connection = getattr(self._local, 'connection', (None, None))
+        if pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=10, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.connection = (os.getpid(), connection)
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _row(self, connection, key):
+        row = connection.execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= time.time():
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time())
+            )
+            return None
+        return row
+
+    def _cull(self, connection):
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # Бессрочные ключи (версии, поколение, отметки изменений) не
+            # вытесняются: их немного, а потеря ломает инвалидацию.
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'WHERE expires IS NOT NULL ORDER BY expires LIMIT ?)',
+                (count // self._cull_frequency,)
+            )
+
+    def get(self, key, default=None, version=None):
+        row = self._row(self._connection(), self._key(key, version))
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (
+                self._key(key, version),
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                self.get_backend_timeout(timeout)
+            )
+        )
+        # Чистим хранилище примерно раз на CULL_FREQUENCY записей.
+        if int.from_bytes(os.urandom(1), 'big') % self._cull_frequency == 0:
+            self._cull(connection)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (
+                self._key(key, version),
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                self.get_backend_timeout(timeout),
+                time.time()
+            )
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (
+                self.get_backend_timeout(timeout),
+                self._key(key, version),
+                time.time()
+            )
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        cursor = self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+        return cursor.rowcount == 1
+
+    def has_key(self, key, version=None):
+        return self._row(
+            self._connection(), self._key(key, version)
+        ) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._row(connection, key)
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key)
+            )
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+
+class _LocalTier:
+    """LRU первого уровня, общий для всех потоков процесса."""
+
+    def __init__(self):
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.checked_at = 0
+
+    def get(self, key, generation):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry is None:
+                return MISSING
+            value, expires, entry_generation = entry
+            if entry_generation != generation or expires <= time.time():
+                del self.data[key]
+                return MISSING
+            self.data.move_to_end(key)
+        return pickle.loads(value)
+
+    def put(self, key, value, generation, expires, max_entries):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.data[key] = (value, expires, generation)
+            self.data.move_to_end(key)
+            while len(self.data) > max_entries:
+                self.data.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+_tiers = {}
+
+
+class TwoTierCache(BaseCache):
+    """L1 в памяти процесса перед общим кешем, заданным в LOCATION.
+
+    OPTIONS:
+        MAX_ENTRIES — размер L1;
+        METRICS_LABEL — если задано, попадания и промахи `get` считаются
+        в метрике `yatube_cache_requests_total` с этой меткой;
+        L1_TIMEOUT — сколько секунд запись живёт в L1;
+        GENERATION_INTERVAL — как часто (в секундах) сверять поколение.
+
+    `set` обновляет L1 только своего процесса: другие процессы увидят
+    новое значение не позже чем через L1_TIMEOUT. Инвалидация через
+    `delete`, `incr`/`decr` и `clear` видна всем не позже чем через
+    GENERATION_INTERVAL.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._l1_timeout = options.get('L1_TIMEOUT', 5)
+        self._interval = options.get('GENERATION_INTERVAL', 0.5)
+        self._tier = _tiers.setdefault(location, _LocalTier())
+        self._metrics_label = options.get('METRICS_LABEL')
+
+    @cached_property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _generation(self):
+        tier = self._tier
+        now = time.monotonic()
+        if tier.generation is None or now - tier.checked_at >= self._interval:
+            generation = self.shared.get(GENERATION_KEY)
+            if generation is None:
+                self.shared.add(GENERATION_KEY, _fresh_generation(), None)
+                generation = self.shared.get(GENERATION_KEY)
+            tier.generation, tier.checked_at = generation, now
+        return tier.generation
+
+    def _bump(self):
+        try:
+            generation = self.shared.incr(GENERATION_KEY)
+        except ValueError:
+            generation = _fresh_generation()
+            self.shared.set(GENERATION_KEY, generation, None)
+        self._tier.generation = generation
+        self._tier.checked_at = time.monotonic()
+
+    def _remember(self, key, value, timeout):
+        expires = time.time() + self._l1_timeout
+        backend_expires = self.get_backend_timeout(timeout)
+        if backend_expires is not None:
+            expires = min(expires, backend_expires)
+        self._tier.put(
+            key, value, self._generation(), expires, self._max_entries
+        )
+
+    def _record(self, hit):
+        stats.record_cache(hit)
+        if self._metrics_label:
+            metrics.cache_lookup(self._metrics_label, hit)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        value = self._tier.get(key, self._generation())
+        if value is not MISSING:
+            self._record(True)
+            return value
+        value = self.shared.get(key, MISSING)
+        self._record(value is not MISSING)
+        if value is MISSING:
+            return default
+        self._remember(key, value, self._l1_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        self.shared.set(key, value, timeout)
+        self._remember(key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        added = self.shared.add(key, value, timeout)
+        if added:
+            self._remember(key, value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self.shared.touch(self._key(key, version), timeout)
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._tier.pop(key)
+        deleted = self.shared.delete(key)
+        self._bump()
+        return deleted
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        value = self.shared.incr(key, delta)
+        self._tier.pop(key)
+        self._bump()
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version)
+
+    def clear(self):
+        self.shared.clear()
+        self._tier.clear()
+        self._bump()
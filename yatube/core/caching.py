@@ -0,0 +1,202 @@
+"""Кеширование страниц: версионированные ключи и защита от лавины.
+
+Каждое пространство имён (например, `index`) хранит в кеше номер
+версии, который входит в ключи страниц и фрагментов. Увеличение
+версии делает все старые ключи недостижимыми, поэтому TTL можно
+держать долгим без риска показать устаревшую страницу.
+
+`cache_page_swr` заменяет `cache_page`: одновременные промахи
+схлопываются в одну отрисовку (блокировка в кеше), а истёкшая копия
+отдаётся, пока один запрос её обновляет.
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+
+from . import metrics
+from .routers import primary_reads
+
+
+def _version_key(namespace):
+    return f'version:{namespace}'
+
+
+def _changed_key(namespace):
+    return f'changed:{namespace}'
+
+
+def get_version(namespace):
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # Начинаем с отметки времени, а не с 1: если ключ версии вытеснен
+        # из кеша, новая версия не совпадёт ни с одной из прежних.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*namespaces):
+    now = timezone.now()
+    for namespace in namespaces:
+        try:
+            cache.incr(_version_key(namespace))
+        except ValueError:
+            get_version(namespace)
+        cache.set(_changed_key(namespace), now, None)
+
+
+def get_changed(namespace):
+    """Время последнего `bump_version` или None, если его не было."""
+    return cache.get(_changed_key(namespace))
+
+
+def _page_key(request, key_prefix):
+    # Анонимам отдаём общую копию, остальным — личную: в шапке
+    # страницы выводится имя пользователя.
+    audience = (
+        f'user{request.user.pk}' if request.user.is_authenticated
+        else 'anonymous'
+    )
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'page:{key_prefix}:{audience}:{url}'
+
+
+def _is_cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.cookies
+        and 'private' not in response.get('Cache-Control', '')
+    )
+
+
+def _store_when_streamed(response, store):
+    # Потоковый ответ кладём в кеш обычным, когда клиент дочитал его
+    # до конца; если поток оборвётся, блокировку снимет таймаут.
+    # Заголовки снимаем сразу, до того как их дополнят внешние слои.
+    headers = list(response.items())
+    status, content = response.status_code, response.streaming_content
+
+    def tee():
+        chunks = []
+        for chunk in content:
+            chunks.append(chunk)
+            yield chunk
+        cached = HttpResponse(b''.join(chunks), status=status)
+        for header, value in headers:
+            cached[header] = value
+        store(cached)
+
+    return tee()
+
+
+def _render_and_store(render, key, lock_key, lock_token, timeout,
+                      stale_timeout):
+    # Блокировку снимаем, как только копия в кеше (или класть нечего),
+    # чтобы следующее обновление не ждало lock_timeout. Чужую
+    # блокировку (lock_token=None или уже другой токен после истечения
+    # нашей) не трогаем: её владелец ещё рисует страницу.
+    def release():
+        if lock_token is not None and cache.get(lock_key) == lock_token:
+            cache.delete(lock_key)
+
+    try:
+        # Копия живёт в кеше до следующей записи, поэтому рисуем её по
+        # основной базе, а не по реплике, которая может отставать.
+        with primary_reads():
+            response = render()
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+    except Exception:
+        release()
+        raise
+    if not _is_cacheable(response):
+        release()
+        return response
+
+    def store(cached):
+        cache.set(
+            key, (cached, time.time() + timeout), timeout + stale_timeout
+        )
+        release()
+
+    if response.streaming:
+        response.streaming_content = _store_when_streamed(response, store)
+    else:
+        store(response)
+    return response
+
+
+def cached_response(request, render, timeout, key_prefix='',
+                    stale_timeout=None, lock_timeout=10, wait_timeout=2):
+    """Отдаёт страницу из кеша, отрисовывая её не более чем в одном запросе.
+
+    Свежая копия отдаётся сразу. Истёкшая (но моложе `stale_timeout`)
+    тоже отдаётся сразу, а обновляет её тот запрос, что взял блокировку.
+    При полном промахе запросы без блокировки до `wait_timeout` секунд
+    ждут, пока копию положит владелец блокировки.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return render()
+    if stale_timeout is None:
+        stale_timeout = timeout
+    key = _page_key(request, key_prefix)
+    lock_key = f'{key}:lock'
+    lock_token = uuid.uuid4().hex
+    entry = cache.get(key)
+    metrics.cache_lookup('page', entry is not None)
+    if entry is not None:
+        response, fresh_until = entry
+        if fresh_until > time.time() or not cache.add(
+            lock_key, lock_token, lock_timeout
+        ):
+            return response
+        return _render_and_store(
+            render, key, lock_key, lock_token, timeout, stale_timeout
+        )
+    if not cache.add(lock_key, lock_token, lock_timeout):
+        deadline = time.monotonic() + wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return _render_and_store(
+            render, key, lock_key, None, timeout, stale_timeout
+        )
+    return _render_and_store(
+        render, key, lock_key, lock_token, timeout, stale_timeout
+    )
+
+
+def cache_page_swr(timeout, key_prefix='', **options):
+    """Декоратор-замена `cache_page` с single-flight и stale-while-revalidate.
+
+    `key_prefix` может быть функцией от запроса.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return cached_response(
+                request,
+                lambda: view(request, *args, **kwargs),
+                timeout,
+                key_prefix(request) if callable(key_prefix) else key_prefix,
+                **options
+            )
+        return wrapper
+    return decorator
+
+
+def versioned_cache_page(timeout, namespace, **options):
+    """`cache_page_swr`, ключи которого сбрасываются `bump_version`."""
+    return cache_page_swr(
+        timeout,
+        key_prefix=lambda request: f'{namespace}.{get_version(namespace)}',
+        **options
+    )
@@ -0,0 +1,54 @@
+"""Настройка соединений SQLite и проверка постоянных соединений.
+
+`configure_connection` выполняет PRAGMA из `SQLITE_PRAGMAS` на каждом
+новом соединении: WAL позволяет читателям не ждать писателя. Писатели
+ждут друг друга, а не падают с «database is locked», `OPTIONS['timeout']`
+секунд: из него драйвер sqlite3 выставляет `busy_timeout`.
+
+При `CONN_MAX_AGE` соединение переживает запрос, поэтому в начале
+запроса `check_connections` убеждается, что оно ещё живо, и закрывает
+сломанное: Django откроет новое при первом запросе к базе.
+"""
+import logging
+import sqlite3
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection.cursor(), settings.SQLITE_PRAGMAS)
+
+
+def _is_alive(connection):
+    # Пингуем через DB-API напрямую, мимо курсоров Django, чтобы
+    # проверка не попадала в счётчики и журналы запросов.
+    try:
+        connection.connection.cursor().execute('SELECT 1')
+    except (DatabaseError, sqlite3.Error):
+        return False
+    return True
+
+
+def check_connection(connection):
+    """Закрывает постоянное соединение, если оно перестало отвечать."""
+    if connection.connection is None or connection.in_atomic_block:
+        return
+    if not _is_alive(connection):
+        logger.warning(
+            'Соединение %s сломано, открываем новое', connection.alias
+        )
+        connection.close()
+
+
+def check_connections(**kwargs):
+    for connection in connections.all():
+        check_connection(connection)
@@ -0,0 +1,140 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import apply_pragmas
+
+# Настройки соединения Django по умолчанию: журнал отката и 5 секунд
+# ожидания блокировки (умолчание драйвера sqlite3).
+DEFAULT_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+DEFAULT_TIMEOUT = 5
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает параллельные чтение и запись в SQLite с настройками '
+        'по умолчанию и с SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument(
+            '--seconds', type=float, default=3,
+            help='Длительность каждого прогона'
+        )
+        parser.add_argument(
+            '--timeout', type=float,
+            help='Таймаут драйвера sqlite3 для обоих прогонов вместо '
+                 'настоящих (5 с по умолчанию и OPTIONS из DATABASES)'
+        )
+
+    def run(self, path, pragmas, timeout, options):
+        setup = sqlite3.connect(path)
+        apply_pragmas(setup, pragmas)
+        setup.execute(
+            'CREATE TABLE comments (id INTEGER PRIMARY KEY, post INTEGER, '
+            'text TEXT)'
+        )
+        setup.executemany(
+            'INSERT INTO comments (post, text) VALUES (?, ?)',
+            [(i % 100, 'x' * 200) for i in range(10000)]
+        )
+        setup.commit()
+        setup.close()
+        counts = {'reads': 0, 'writes': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def connect():
+            connection = sqlite3.connect(
+                path, timeout=timeout, check_same_thread=False
+            )
+            # Режим журнала хранится в файле базы и уже выставлен.
+            apply_pragmas(connection, {
+                name: value for name, value in pragmas.items()
+                if name != 'journal_mode'
+            })
+            return connection
+
+        def worker(connection, write):
+            done = errors = 0
+            while time.monotonic() < deadline:
+                try:
+                    if write:
+                        with connection:
+                            connection.execute(
+                                'INSERT INTO comments (post, text) '
+                                'VALUES (?, ?)', (done % 100, 'y' * 200)
+                            )
+                    else:
+                        connection.execute(
+                            'SELECT COUNT(*), MAX(id) FROM comments '
+                            'WHERE post = ?', (done % 100,)
+                        ).fetchone()
+                    done += 1
+                except sqlite3.OperationalError:
+                    errors += 1
+            connection.close()
+            with lock:
+                counts['writes' if write else 'reads'] += done
+                counts['errors'] += errors
+
+        # Соединения открываются до старта потоков: настройка PRAGMA
+        # читает схему и под нагрузкой сама упиралась бы в блокировку.
+        writes = [False] * options['readers'] + [True] * options['writers']
+        connections = [connect() for _ in writes]
+        # Показываем ожидание, которое действует после всех PRAGMA, а не
+        # то, что передано драйверу.
+        busy_timeout = connections[0].execute(
+            'PRAGMA busy_timeout'
+        ).fetchone()[0] / 1000
+        threads = [
+            threading.Thread(target=worker, args=(connection, write))
+            for connection, write in zip(connections, writes)
+        ]
+        deadline = time.monotonic() + options['seconds']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result = {
+            key: value / options['seconds'] if key != 'errors' else value
+            for key, value in counts.items()
+        }
+        result['busy_timeout'] = busy_timeout
+        return result
+
+    def handle(self, *args, **options):
+        runs = {
+            'Django по умолчанию': (DEFAULT_PRAGMAS, DEFAULT_TIMEOUT),
+            'SQLITE_PRAGMAS': (
+                settings.SQLITE_PRAGMAS,
+                settings.DATABASES['default']['OPTIONS'].get(
+                    'timeout', DEFAULT_TIMEOUT
+                )
+            ),
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for number, (name, (pragmas, timeout)) in enumerate(
+                runs.items()
+            ):
+                if options['timeout'] is not None:
+                    timeout = options['timeout']
+                result = self.run(
+                    os.path.join(directory, f'{number}.sqlite3'),
+                    pragmas,
+                    timeout,
+                    options
+                )
+                self.stdout.write(
+                    f'{name} (ожидание блокировки '
+                    f'{result["busy_timeout"]:g} с): '
+                    f'чтений {result["reads"]:.0f}/с, '
+                    f'записей {result["writes"]:.0f}/с, '
+                    f'ошибок блокировки {result["errors"]}'
+                )
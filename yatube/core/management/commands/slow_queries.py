@@ -0,0 +1,55 @@
+import glob
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import summarize
+
+
+class Command(BaseCommand):
+    help = 'Сводка журнала медленных запросов по отпечаткам SQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Файлы журнала; по умолчанию SLOW_QUERY_LOG и его архивы'
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--source', default='',
+            help='Только запросы из источников с этим началом, '
+                 'например posts:'
+        )
+
+    def read(self, paths):
+        for path in paths:
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or sorted(
+            glob.glob(f'{glob.escape(settings.SLOW_QUERY_LOG)}*')
+        )
+        groups = summarize(self.read(paths), options['source'])
+        for group in groups[:options['limit']]:
+            self.stdout.write(
+                '{fingerprint}  {count} раз, всего {total_ms:.1f} ms, '
+                'максимум {max_ms:.1f} ms'.format(**group)
+            )
+            self.stdout.write(
+                '  источники: ' + ', '.join(sorted(group['sources']))
+            )
+            if group['callers']:
+                self.stdout.write(
+                    '  вызовы: ' + ', '.join(sorted(group['callers']))
+                )
+            self.stdout.write(f'  SQL: {group["sql"]}')
+            if group.get('plan'):
+                self.stdout.write('  план: ' + '; '.join(group['plan']))
+        if not groups:
+            self.stdout.write('Медленных запросов нет')
@@ -0,0 +1,39 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.caching import bump_version
+from posts.conditional import CONTENT
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из '
+        'DATABASE_REPLICAS'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write('Реплики не настроены (YATUBE_REPLICAS)')
+            return
+        primary = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                # Backup API копирует согласованный снимок и пишет прямо в
+                # файл реплики, поэтому открытые соединения к ней увидят
+                # новые данные, а не останутся на старом файле.
+                replica = sqlite3.connect(connections[alias].settings_dict[
+                    'NAME'
+                ])
+                try:
+                    primary.backup(replica)
+                finally:
+                    replica.close()
+                self.stdout.write(f'{alias}: скопирована')
+        finally:
+            primary.close()
+        # Страницы, отрисованные до копирования, могли видеть старые
+        # данные реплик.
+        bump_version('index', CONTENT)
@@ -0,0 +1,219 @@
+"""Метрики приложения в текстовом формате Prometheus.
+
+Каждый процесс копит счётчики и гистограммы в памяти. Если задан
+`METRICS_DIR`, процесс не чаще раза в `METRICS_FLUSH_INTERVAL` секунд
+сбрасывает свой снимок в отдельный файл этого каталога, а `render`
+складывает снимки всех процессов, так что при нескольких воркерах
+итоги верны. Каталог нужно очищать при перезапуске сервиса, иначе
+счётчики продолжат копиться с прошлого запуска.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа представления, секунды', LATENCY_BUCKETS
+    ),
+    'yatube_responses_total': (
+        'counter', 'Ответы представлений по кодам статуса', None
+    ),
+    'yatube_db_queries': (
+        'histogram',
+        'SQL-запросов за запрос (по выборке REQUEST_STATS_SAMPLE_RATE)',
+        (1, 2, 5, 10, 20, 50, 100)
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Обращения к кешу страниц и фрагментов шаблонов', None
+    ),
+    'yatube_thumbnail_generation_seconds': (
+        'histogram', 'Время построения миниатюр картинки, секунды',
+        (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    ),
+}
+
+
+class Registry:
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        self._file_name = f'{uuid.uuid4().hex}.json'
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self.counters[name, labels] += value
+        self._changed()
+
+    def observe(self, name, labels, value):
+        bounds = METRICS[name][2]
+        with self._lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                # Счётчики по корзинам (последняя — +Inf) и сумма.
+                histogram = self.histograms[name, labels] = [
+                    [0] * (len(bounds) + 1), 0.0
+                ]
+            histogram[0][bisect.bisect_left(bounds, value)] += 1
+            histogram[1] += value
+        self._changed()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, labels, list(buckets), total]
+                    for (name, labels), (buckets, total)
+                    in self.histograms.items()
+                ],
+            }
+
+    def _path(self):
+        return os.path.join(
+            settings.METRICS_DIR, f'{os.getpid()}-{self._file_name}'
+        )
+
+    def _changed(self):
+        if not settings.METRICS_DIR or self._timer is not None:
+            return
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(
+                settings.METRICS_FLUSH_INTERVAL, self.flush
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Записывает снимок процесса в `METRICS_DIR`."""
+        self._timer = None
+        if not settings.METRICS_DIR:
+            return
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = self._path()
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Снимки всех процессов, сложенные вместе."""
+        snapshots = [self.snapshot()]
+        if settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+            own = os.path.basename(self._path())
+            for entry in os.scandir(settings.METRICS_DIR):
+                if entry.name == own or not entry.name.endswith('.json'):
+                    continue
+                try:
+                    with open(entry.path) as file:
+                        snapshots.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+        counters = defaultdict(float)
+        histograms = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                counters[name, _labels(labels)] += value
+            for name, labels, buckets, total in snapshot['histograms']:
+                key = name, _labels(labels)
+                if key not in histograms:
+                    histograms[key] = [[0] * len(buckets), 0.0]
+                merged = histograms[key]
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += total
+        return counters, histograms
+
+
+def _labels(pairs):
+    return tuple(tuple(pair) for pair in pairs)
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _format(name, labels, value, extra=()):
+    pairs = ','.join(
+        f'{key}="{_escape(label)}"' for key, label in labels + extra
+    )
+    if pairs:
+        name = f'{name}{{{pairs}}}'
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return f'{name} {value}'
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+
+def inc(name, labels=(), value=1):
+    registry.inc(name, labels, value)
+
+
+def observe(name, labels, value):
+    registry.observe(name, labels, value)
+
+
+def cache_lookup(cache_name, hit):
+    inc('yatube_cache_requests_total', (
+        ('cache', cache_name), ('result', 'hit' if hit else 'miss')
+    ))
+
+
+@contextmanager
+def timer(name, labels=()):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, labels, time.perf_counter() - start)
+
+
+def render():
+    """Все метрики всех процессов в текстовом формате Prometheus."""
+    counters, histograms = registry.collect()
+    lines = []
+    for name, (kind, description, bounds) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            lines.extend(
+                _format(name, labels, value)
+                for (metric, labels), value in sorted(counters.items())
+                if metric == name
+            )
+            continue
+        for (metric, labels), (buckets, total) in sorted(
+            histograms.items()
+        ):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(bounds + ('+Inf',), buckets):
+                cumulative += count
+                lines.append(_format(
+                    f'{name}_bucket', labels, cumulative, (('le', bound),)
+                ))
+            lines.append(_format(f'{name}_sum', labels, total))
+            lines.append(_format(f'{name}_count', labels, cumulative))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,176 @@
+import logging
+import random
+import time
+
+from django.conf import settings
+
+from . import metrics, profiling, slow_queries, stats
+from .routers import read_from_replica, wrote_to_primary
+
+logger = logging.getLogger('core.stats')
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплик для представлений-списков.
+
+    После записи пользователь получает cookie, и его чтения
+    `REPLICA_STICKY_SECONDS` секунд идут в основную базу, чтобы он
+    сразу видел свои изменения, даже если реплика отстаёт.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        wrote = wrote_to_primary.set(False)
+        replica = read_from_replica.set(False)
+        try:
+            response = self.get_response(request)
+            if wrote_to_primary.get():
+                response.set_cookie(
+                    settings.REPLICA_STICKY_COOKIE,
+                    str(time.time() + settings.REPLICA_STICKY_SECONDS),
+                    max_age=settings.REPLICA_STICKY_SECONDS,
+                    httponly=True,
+                    samesite='Lax'
+                )
+            return response
+        finally:
+            read_from_replica.reset(replica)
+            wrote_to_primary.reset(wrote)
+
+    def _is_sticky(self, request):
+        try:
+            until = float(request.COOKIES[settings.REPLICA_STICKY_COOKIE])
+        except (KeyError, ValueError):
+            return False
+        return until > time.time()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if (
+            request.method in ('GET', 'HEAD')
+            and match is not None
+            and match.view_name in settings.REPLICA_READ_VIEWS
+            and not self._is_sticky(request)
+        ):
+            read_from_replica.set(True)
+
+
+class RequestStatsMiddleware:
+    """Собирает статистику для доли `REQUEST_STATS_SAMPLE_RATE` запросов.
+
+    Итог выборочного запроса пишется в лог на уровне DEBUG и остаётся в
+    `request.stats`. Запрос дольше `REQUEST_STATS_SLOW_MS` пишется с
+    уровнем WARNING всегда, а если попал в выборку — с самыми долгими
+    SQL-запросами.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        if random.random() >= settings.REQUEST_STATS_SAMPLE_RATE:
+            request.stats = None
+            response = self.get_response(request)
+        else:
+            top = settings.REQUEST_STATS_TOP_QUERIES
+            with stats.collect(top) as request.stats:
+                response = self.get_response(request)
+        self.report(request, response, time.perf_counter() - start)
+        return response
+
+    def report(self, request, response, wall_time):
+        slow = wall_time * 1000 >= settings.REQUEST_STATS_SLOW_MS
+        if not slow and request.stats is None:
+            return
+        match = getattr(request, 'resolver_match', None)
+        message = '%s %s %s %d: %.1f ms' % (
+            request.method, request.path,
+            match.view_name if match else '-',
+            response.status_code, wall_time * 1000
+        )
+        collected = request.stats
+        if collected is not None:
+            message += (
+                ', SQL %d за %.1f ms, шаблоны %.1f ms, кеш %d/%d' % (
+                    collected.query_count, collected.db_time * 1000,
+                    collected.template_time * 1000,
+                    collected.cache_hits,
+                    collected.cache_hits + collected.cache_misses
+                )
+            )
+        if not slow:
+            logger.debug(message)
+            return
+        if collected is not None:
+            message += ''.join(
+                '\n  %.1f ms: %s' % (duration * 1000, sql)
+                for duration, sql in collected.top_queries()
+            )
+        logger.warning('Медленный запрос %s', message)
+
+
+class MetricsMiddleware:
+    """Время ответа, коды статуса и число SQL-запросов по представлениям.
+
+    Считаются только представления из `METRICS_NAMESPACES`.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        # Без совпадения URL ответ отрисовал handler404.
+        view_name = match.view_name if match else 'core:page_not_found'
+        if view_name.split(':')[0] not in settings.METRICS_NAMESPACES:
+            return response
+        labels = (('view', view_name),)
+        metrics.observe(
+            'yatube_request_duration_seconds', labels,
+            time.perf_counter() - start
+        )
+        metrics.inc(
+            'yatube_responses_total',
+            labels + (('status', str(response.status_code)),)
+        )
+        collected = getattr(request, 'stats', None)
+        if collected is not None:
+            metrics.observe(
+                'yatube_db_queries', labels, collected.query_count
+            )
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос персонала с `?profile=1` (см. core/profiling.py)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trace_memory = profiling.requested_mode(request)
+        if trace_memory is None:
+            return self.get_response(request)
+        return profiling.profile(request, self.get_response, trace_memory)
+
+
+class QuerySourceMiddleware:
+    """Подписывает медленные запросы именем представления."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = slow_queries.source.set(f'{request.method} {request.path}')
+        try:
+            return self.get_response(request)
+        finally:
+            slow_queries.source.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slow_queries.source.set(request.resolver_match.view_name)
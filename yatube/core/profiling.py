@@ -0,0 +1,104 @@
+"""Профилирование отдельного запроса по запросу персонала.
+
+Запрос с `?profile=1` или заголовком `X-Profile: 1` выполняется под
+cProfile; значение `memory` дополнительно включает tracemalloc. В
+`PROFILE_DIR` сохраняются `.prof` (формат pstats: его открывают
+snakeviz, а flameprof строит из него флеймграф) и текстовая сводка.
+
+cProfile следит только за своим потоком, поэтому остальные запросы не
+замедляются. tracemalloc действует на весь процесс, пока запрос не
+закончится, и в процессе одновременно профилируется только один запрос.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+
+MODES = {'1': False, 'memory': True}
+
+_lock = threading.Lock()
+
+
+def requested_mode(request):
+    """`None`, если профилирование не запрошено, иначе нужен ли tracemalloc."""
+    value = request.GET.get('profile') or request.META.get('HTTP_X_PROFILE')
+    if value not in MODES:
+        return None
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_staff:
+        return None
+    return MODES[value]
+
+
+def _base_name(request):
+    match = request.resolver_match
+    view = match.view_name if match else 'unresolved'
+    # Короткий uuid: иначе два запроса за одну секунду перезаписали бы
+    # файлы друг друга.
+    name = '{}-{}-{}-{}'.format(
+        time.strftime('%Y%m%d-%H%M%S'), view, request.user.get_username(),
+        uuid.uuid4().hex[:8]
+    )
+    return re.sub(r'[^\w.-]', '_', name.replace(':', '.'))
+
+
+def _summary(request, response, profiler, wall_time, memory):
+    stream = io.StringIO()
+    stream.write(
+        f'{request.method} {request.get_full_path()} '
+        f'{response.status_code}\n'
+        f'Пользователь: {request.user.get_username()}\n'
+        f'Время: {wall_time * 1000:.1f} ms\n\n'
+    )
+    pstats.Stats(profiler, stream=stream).sort_stats(
+        'cumulative'
+    ).print_stats(settings.PROFILE_TOP_ENTRIES)
+    if memory is not None:
+        snapshot, peak = memory
+        stream.write(f'tracemalloc: пик {peak / 1024:.1f} KiB\n')
+        for statistic in snapshot.statistics('lineno')[
+            :settings.PROFILE_TOP_ENTRIES
+        ]:
+            stream.write(f'{statistic}\n')
+    return stream.getvalue()
+
+
+def profile(request, get_response, trace_memory):
+    """Выполняет запрос под профилировщиком и сохраняет результаты."""
+    if not _lock.acquire(blocking=False):
+        return get_response(request)
+    try:
+        trace_memory = trace_memory and not tracemalloc.is_tracing()
+        if trace_memory:
+            tracemalloc.start()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            response = profiler.runcall(get_response, request)
+        finally:
+            wall_time = time.perf_counter() - start
+            memory = None
+            if trace_memory:
+                memory = (
+                    tracemalloc.take_snapshot(),
+                    tracemalloc.get_traced_memory()[1]
+                )
+                tracemalloc.stop()
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILE_DIR, _base_name(request))
+        profiler.dump_stats(f'{path}.prof')
+        with open(f'{path}.txt', 'w') as file:
+            file.write(
+                _summary(request, response, profiler, wall_time, memory)
+            )
+    finally:
+        _lock.release()
+    response['X-Profile'] = os.path.basename(path)
+    return response
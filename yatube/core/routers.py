@@ -0,0 +1,56 @@
+"""Маршрутизация чтения на реплики.
+
+Читать с реплик разрешает `ReplicaMiddleware` — только во время
+представлений из `REPLICA_READ_VIEWS` и только если пользователь
+недавно ничего не записывал. Всё остальное, включая любые записи,
+идёт в `default`.
+
+Страницы, которые кладутся в кеш, и валидаторы ETag/Last-Modified
+читают с основной базы (см. `primary_reads`): иначе отставшая реплика
+попала бы в кеш под новой версией и жила бы там до конца TTL.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Сессии и пользователи читаются лениво уже внутри представления, а
+# реплика может ещё не знать о новом входе: без сессии на реплике
+# SessionMiddleware удалил бы cookie и разлогинил пользователя.
+PRIMARY_ONLY_APPS = {'sessions', 'auth', 'contenttypes'}
+
+read_from_replica = ContextVar('read_from_replica', default=False)
+wrote_to_primary = ContextVar('wrote_to_primary', default=False)
+
+
+@contextmanager
+def primary_reads():
+    """Внутри блока все чтения идут в основную базу."""
+    token = read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        read_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (
+            settings.DATABASE_REPLICAS
+            and read_from_replica.get()
+            and model._meta.app_label not in PRIMARY_ONLY_APPS
+        ):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        wrote_to_primary.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, объекты из них совместимы.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
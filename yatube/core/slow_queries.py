@@ -0,0 +1,160 @@
+"""Журнал медленных SQL-запросов.
+
+`record` подключается к каждому соединению (см. `install`) и пишет в
+логгер `core.slow_queries` запросы дольше `SLOW_QUERY_THRESHOLD_MS` —
+по JSON-строке на запрос: нормализованный SQL и его отпечаток,
+обезличенные параметры, источник (представление или команда
+manage.py), место вызова в коде проекта и `EXPLAIN QUERY PLAN`.
+Быстрые запросы стоят лишь двух замеров времени. Сводку по отпечаткам
+строит команда `slow_queries`.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+import traceback
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.backends.sqlite3.base import SQLiteCursorWrapper
+
+logger = logging.getLogger(__name__)
+
+source = ContextVar('query_source', default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_SPACES = re.compile(r'\s+')
+_OWN_FILE = os.path.abspath(__file__)
+
+
+def normalize(sql):
+    """SQL без значений: литералы заменены на `?`, списки — на `(...)`."""
+    sql = _LITERALS.sub('?', sql)
+    sql = _LISTS.sub('(...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:12]
+
+
+def redact(params, many=False):
+    """Параметры без персональных данных: от строк остаётся длина."""
+    if many:
+        return f'<{len(params)} наборов>'
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: _redact_value(value) for key, value in params.items()}
+    return [_redact_value(value) for value in params]
+
+
+def _redact_value(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (str, bytes, memoryview)):
+        return f'<{type(value).__name__}:{len(value)}>'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return f'<{type(value).__name__}>'
+
+
+def current_source():
+    value = source.get()
+    if value is not None:
+        return value
+    if os.path.basename(sys.argv[0]) == 'manage.py' and len(sys.argv) > 1:
+        return f'manage.py {sys.argv[1]}'
+    return os.path.basename(sys.argv[0])
+
+
+def caller():
+    """Ближайший к запросу кадр стека из кода проекта, а не Django."""
+    for frame in reversed(traceback.extract_stack()):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(settings.BASE_DIR) and path != _OWN_FILE:
+            return '{}:{} in {}'.format(
+                os.path.relpath(path, settings.BASE_DIR), frame.lineno,
+                frame.name
+            )
+    return None
+
+
+def explain(connection, sql, params):
+    if connection.vendor != 'sqlite':
+        return None
+    if sql.split(None, 1)[0].upper() not in ('SELECT', 'WITH'):
+        return None
+    try:
+        cursor = connection.connection.cursor(factory=SQLiteCursorWrapper)
+        try:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except (DatabaseError, sqlite3.Error) as error:
+        return [f'EXPLAIN не удался: {error}']
+
+
+def record(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+            normalized = normalize(sql)
+            logger.warning(json.dumps({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'duration_ms': round(duration * 1000, 3),
+                'fingerprint': fingerprint(normalized),
+                'sql': normalized,
+                'params': redact(params, many),
+                'source': current_source(),
+                'caller': caller(),
+                'database': context['connection'].alias,
+                'plan': None if many else explain(
+                    context['connection'], sql, params
+                ),
+            }, ensure_ascii=False))
+
+
+def summarize(records, source_prefix=''):
+    """Записи журнала, сгруппированные по отпечатку, от самых затратных."""
+    groups = {}
+    for entry in records:
+        if not (entry['source'] or '').startswith(source_prefix):
+            continue
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'sql': entry['sql'],
+            'count': 0,
+            'total_ms': 0.0,
+            'max_ms': 0.0,
+            'sources': set(),
+            'callers': set(),
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        group['sources'].add(entry['source'])
+        if entry['caller']:
+            group['callers'].add(entry['caller'])
+        if entry['plan']:
+            group['plan'] = entry['plan']
+    return sorted(
+        groups.values(), key=lambda group: group['total_ms'], reverse=True
+    )
+
+
+def install(sender, connection, **kwargs):
+    # В начало списка: execute_wrapper() снимает свои обёртки через
+    # pop(), и постоянная обёртка в конце списка сняла бы чужую.
+    if record not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record)
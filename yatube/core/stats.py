@@ -0,0 +1,89 @@
+"""Статистика одного запроса: SQL, шаблоны, кеш.
+
+`collect` включает сбор для текущего контекста: запросы к базе
+проходят через `execute_wrapper`, а шаблоны и кеш отмечаются сами через
+`rendering` и `record_cache`. Вне `collect` эти вызовы ничего не делают,
+поэтому запросы, не попавшие в выборку, почти ничего не стоят.
+"""
+import heapq
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+_current = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self, top=5):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._top = top
+        self._slowest = []
+        self._rendering = False
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.query_count += 1
+            self.db_time += duration
+            # Храним только самые долгие запросы: память не растёт
+            # даже у представлений с тысячами запросов.
+            entry = (duration, self.query_count, sql)
+            if len(self._slowest) < self._top:
+                heapq.heappush(self._slowest, entry)
+            elif self._top:
+                heapq.heappushpop(self._slowest, entry)
+
+    def top_queries(self):
+        """Самые долгие запросы: пары (секунды, SQL) по убыванию."""
+        return [
+            (duration, sql)
+            for duration, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+
+@contextmanager
+def collect(top=5):
+    stats = RequestStats(top)
+    token = _current.set(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats.execute))
+            yield stats
+    finally:
+        _current.reset(token)
+
+
+def record_cache(hit):
+    stats = _current.get()
+    if stats is None:
+        return
+    if hit:
+        stats.cache_hits += 1
+    else:
+        stats.cache_misses += 1
+
+
+@contextmanager
+def rendering():
+    """Учитывает время отрисовки шаблона; вложенные не считаются дважды."""
+    stats = _current.get()
+    if stats is None or stats._rendering:
+        yield
+        return
+    stats._rendering = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.template_time += time.perf_counter() - start
+        stats._rendering = False
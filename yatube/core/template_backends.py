@@ -0,0 +1,19 @@
+from django.template.backends import django as backend
+
+from . import stats
+
+
+class Template(backend.Template):
+    def render(self, context=None, request=None):
+        with stats.rendering():
+            return super().render(context, request)
+
+
+class DjangoTemplates(backend.DjangoTemplates):
+    """Стандартный бэкенд, который отмечает время отрисовки в статистике."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from core.cache_backends import SQLiteCache, TwoTierCache, _LocalTier
+
+TEMP_CACHE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'L1_TIMEOUT': 60, 'GENERATION_INTERVAL': 0},
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': f'{TEMP_CACHE_DIR}/shared.sqlite3',
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class CacheBackendsTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.shared = SQLiteCache(CACHES['shared']['LOCATION'], {})
+        self.shared.clear()
+        # Два экземпляра со своими L1 изображают два процесса-воркера.
+        self.worker = TwoTierCache('shared', CACHES['default'])
+        self.other_worker = TwoTierCache('shared', CACHES['default'])
+        self.other_worker._tier = _LocalTier()
+
+    def test_sqlite_cache(self):
+        """SQLite-кеш поддерживает операции Django-кеша."""
+        self.shared.set('key', {'value': 1})
+        self.assertEqual(self.shared.get('key'), {'value': 1})
+        self.assertFalse(self.shared.add('key', 2))
+        self.assertTrue(self.shared.add('new', 2))
+        self.assertEqual(self.shared.incr('new', 3), 5)
+        with self.assertRaises(ValueError):
+            self.shared.incr('missing')
+        self.shared.set('expired', 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.shared.get('expired'))
+        self.assertTrue(self.shared.add('expired', 2))
+        self.shared.delete('key')
+        self.assertFalse(self.shared.has_key('key'))
+
+    def test_cull_keeps_keys_without_expiry(self):
+        """При переполнении вытесняются только ключи со сроком жизни."""
+        shared = SQLiteCache(
+            CACHES['shared']['LOCATION'],
+            {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2}}
+        )
+        shared.set('version', 1, None)
+        for index in range(10):
+            shared.set(f'page{index}', index, 60 + index)
+        self.assertEqual(shared.get('version'), 1)
+        self.assertIsNone(shared.get('page0'))
+        self.assertEqual(shared.get('page9'), 9)
+
+    def test_workers_share_second_tier(self):
+        """Запись одного воркера видна другому через L2."""
+        self.worker.set('page', 'rendered')
+        self.assertEqual(self.other_worker.get('page'), 'rendered')
+
+    def test_generation_invalidates_first_tier(self):
+        """Инвалидация в одном воркере сбрасывает L1 остальных."""
+        self.worker.set('page', 'old')
+        self.assertEqual(self.other_worker.get('page'), 'old')
+        self.worker.set('page', 'new')
+        self.assertEqual(self.other_worker.get('page'), 'old')
+        self.worker.delete('unrelated')
+        self.assertEqual(self.other_worker.get('page'), 'new')
+
+    def test_first_tier_holds_copies(self):
+        """L1 отдаёт копии, а не общий изменяемый объект."""
+        self.worker.set('list', [1])
+        self.worker.get('list').append(2)
+        self.assertEqual(self.worker.get('list'), [1])
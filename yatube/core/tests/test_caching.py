@@ -0,0 +1,96 @@
+import threading
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from core.caching import _page_key, cache_page_swr
+
+
+class CachePageSWRTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.renders = []
+
+    def view(self, request):
+        time.sleep(0.05)
+        self.renders.append(request)
+        return HttpResponse(f'version {len(self.renders)}')
+
+    def get(self, view):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        return view(request).content
+
+    def test_fresh_copy_is_served_from_cache(self):
+        view = cache_page_swr(60)(self.view)
+        self.assertEqual(self.get(view), self.get(view))
+        self.assertEqual(len(self.renders), 1)
+
+    def test_concurrent_misses_render_once(self):
+        """Одновременные промахи схлопываются в одну отрисовку."""
+        view = cache_page_swr(60)(self.view)
+        contents = []
+        threads = [
+            threading.Thread(target=lambda: contents.append(self.get(view)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.renders), 1)
+        self.assertEqual(set(contents), {b'version 1'})
+
+    def test_stale_copy_is_served_while_refreshing(self):
+        """Пока один запрос обновляет страницу, другие получают старую."""
+        view = cache_page_swr(0.1, lock_timeout=0.1)(self.view)
+        self.get(view)
+        time.sleep(0.15)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        # Блокировку уже держит «другой» запрос, занятый обновлением.
+        cache.add(f'{_page_key(request, "")}:lock', 1, 10)
+        self.assertEqual(self.get(view), b'version 1')
+        self.assertEqual(len(self.renders), 1)
+        cache.delete(f'{_page_key(request, "")}:lock')
+        self.assertEqual(self.get(view), b'version 2')
+
+    def test_lock_is_released_after_refresh(self):
+        """Страница с коротким timeout обновляется, не ожидая lock_timeout."""
+        view = cache_page_swr(0.1, lock_timeout=10)(self.view)
+        self.get(view)
+        for version in (b'version 2', b'version 3'):
+            time.sleep(0.15)
+            self.assertEqual(self.get(view), version)
+
+    def test_failed_render_keeps_foreign_lock(self):
+        """Запрос, не дождавшийся владельца, не снимает чужую блокировку."""
+        def failing_view(request):
+            raise RuntimeError
+
+        view = cache_page_swr(60, wait_timeout=0.1)(failing_view)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        lock_key = f'{_page_key(request, "")}:lock'
+        cache.add(lock_key, 'owner', 10)
+        with self.assertRaises(RuntimeError):
+            view(request)
+        self.assertEqual(cache.get(lock_key), 'owner')
+
+    def test_streamed_response_is_cached_after_reading(self):
+        """Потоковый ответ попадает в кеш, когда его дочитали."""
+        def streaming_view(request):
+            self.renders.append(request)
+            return StreamingHttpResponse(iter([b'part 1, ', b'part 2']))
+
+        view = cache_page_swr(60)(streaming_view)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        response = view(request)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b''.join(response), b'part 1, part 2')
+        self.assertEqual(self.get(view), b'part 1, part 2')
+        self.assertEqual(len(self.renders), 1)
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase, TestCase
+
+from core.db import check_connection
+
+
+class SQLitePragmasTests(TestCase):
+    def test_pragmas_are_applied(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['cache_size']
+            )
+
+    def test_busy_timeout_follows_options(self):
+        """Ожидание блокировки задаёт только OPTIONS['timeout']."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0],
+                settings.DATABASES['default']['OPTIONS']['timeout'] * 1000
+            )
+
+
+class ConnectionHealthTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.connection = DatabaseWrapper(
+            {
+                **connection.settings_dict,
+                'NAME': os.path.join(self.directory, 'db.sqlite3'),
+            },
+            alias='health'
+        )
+        self.addCleanup(self.connection.close)
+
+    def test_file_database_uses_wal(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+
+    def test_broken_connection_is_replaced(self):
+        """Сломанное постоянное соединение закрывается и открывается заново."""
+        self.connection.ensure_connection()
+        check_connection(self.connection)
+        self.assertIsNotNone(self.connection.connection)
+        self.connection.connection.close()
+        with self.assertLogs('core.db', 'WARNING'):
+            check_connection(self.connection)
+        self.assertIsNone(self.connection.connection)
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+class BenchmarkCommandTests(SimpleTestCase):
+    def test_benchmark_reports_both_runs(self):
+        output = StringIO()
+        with mock.patch('threading.excepthook') as excepthook:
+            call_command(
+                'benchmark_sqlite', '--seconds=0.2', '--readers=2',
+                '--writers=2', '--timeout=0.05', stdout=output
+            )
+        excepthook.assert_not_called()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        for line in lines:
+            self.assertIn('ожидание блокировки 0.05 с', line)
@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Post, User
+
+INDEX_URL = reverse('posts:index')
+METRICS_URL = reverse('core:metrics')
+INDEX_OK = (('view', 'posts:index'), ('status', '200'))
+
+
+def counter(name, labels):
+    return metrics.registry.collect()[0].get((name, labels), 0)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_views_are_counted(self):
+        """Ответы и обращения к кешам считаются по представлениям."""
+        responses = counter('yatube_responses_total', INDEX_OK)
+        page_hits = counter(
+            'yatube_cache_requests_total',
+            (('cache', 'page'), ('result', 'hit'))
+        )
+        fragment_misses = counter(
+            'yatube_cache_requests_total',
+            (('cache', 'fragment'), ('result', 'miss'))
+        )
+        not_found = counter(
+            'yatube_responses_total',
+            (('view', 'core:page_not_found'), ('status', '404'))
+        )
+        self.client.get(INDEX_URL)
+        self.client.get(INDEX_URL)
+        self.client.get('/unexisting_page/')
+        self.assertEqual(
+            counter('yatube_responses_total', INDEX_OK), responses + 2
+        )
+        self.assertEqual(
+            counter(
+                'yatube_cache_requests_total',
+                (('cache', 'page'), ('result', 'hit'))
+            ),
+            page_hits + 1
+        )
+        self.assertEqual(
+            counter(
+                'yatube_cache_requests_total',
+                (('cache', 'fragment'), ('result', 'miss'))
+            ),
+            fragment_misses + 1
+        )
+        self.assertEqual(
+            counter(
+                'yatube_responses_total',
+                (('view', 'core:page_not_found'), ('status', '404'))
+            ),
+            not_found + 1
+        )
+
+    def test_endpoint_is_staff_only(self):
+        """Метрики в формате Prometheus видит только персонал."""
+        self.client.get(INDEX_URL)
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(METRICS_URL)
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram', content
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"}',
+            content
+        )
+
+    def test_processes_are_aggregated(self):
+        """Снимки других процессов из METRICS_DIR складываются с текущим."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        buckets = [0] * (len(metrics.LATENCY_BUCKETS) + 1)
+        buckets[0] = 3
+        with open(os.path.join(directory, '1-other.json'), 'w') as file:
+            json.dump({
+                'counters': [['yatube_responses_total', INDEX_OK, 5]],
+                'histograms': [[
+                    'yatube_request_duration_seconds',
+                    [['view', 'posts:elsewhere']], buckets, 0.003
+                ]],
+            }, file)
+        responses = counter('yatube_responses_total', INDEX_OK)
+        with override_settings(METRICS_DIR=directory):
+            self.assertEqual(
+                counter('yatube_responses_total', INDEX_OK), responses + 5
+            )
+            metrics.registry.flush()
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertIn(
+                'yatube_request_duration_seconds_bucket'
+                '{view="posts:elsewhere",le="0.005"} 3',
+                metrics.render()
+            )
@@ -0,0 +1,65 @@
+import os
+import pstats
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+PROFILE_URL = reverse('posts:profile', args=['author'])
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(PROFILE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_staff_request_is_profiled(self):
+        """Запрос персонала сохраняет профиль и сводку с tracemalloc."""
+        self.client.force_login(self.staff)
+        response = self.client.get(PROFILE_URL, {'profile': 'memory'})
+        self.assertEqual(response.status_code, 200)
+        path = os.path.join(self.directory, response['X-Profile'])
+        self.assertIn('posts.profile-staff', path)
+        self.assertGreater(pstats.Stats(f'{path}.prof').total_calls, 0)
+        with open(f'{path}.txt') as file:
+            summary = file.read()
+        self.assertIn('cumulative', summary)
+        self.assertIn('tracemalloc', summary)
+
+    def test_header_switch(self):
+        """Профилирование включается и заголовком, без tracemalloc."""
+        self.client.force_login(self.staff)
+        response = self.client.get(PROFILE_URL, HTTP_X_PROFILE='1')
+        path = os.path.join(self.directory, response['X-Profile'])
+        with open(f'{path}.txt') as file:
+            self.assertNotIn('tracemalloc', file.read())
+
+    def test_profiles_in_one_second_do_not_overwrite(self):
+        """Два запроса подряд сохраняют два разных профиля."""
+        self.client.force_login(self.staff)
+        names = {
+            self.client.get(PROFILE_URL, {'profile': '1'})['X-Profile']
+            for _ in range(2)
+        }
+        self.assertEqual(len(names), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 4)
+
+    def test_other_users_are_not_profiled(self):
+        """Остальным пользователям параметр ничего не включает."""
+        self.client.force_login(self.user)
+        response = self.client.get(PROFILE_URL, {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('X-Profile'))
+        self.assertEqual(os.listdir(self.directory), [])
@@ -0,0 +1,147 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from core.caching import get_version
+from core.middleware import ReplicaMiddleware
+from posts.conditional import CONTENT
+from posts.models import Follow, Post, User
+
+INDEX_URL = reverse('posts:index')
+CREATE_URL = reverse('posts:post_create')
+COOKIE = settings.REPLICA_STICKY_COOKIE
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def serve(self, url, cookies=None, method='get', write=False):
+        """Какую базу роутер выбирает для чтения внутри представления."""
+        request = getattr(RequestFactory(), method)(url)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(url)
+        used = {}
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            used['read'] = router.db_for_read(Post)
+            if write:
+                used['write'] = router.db_for_write(Post)
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        return used, middleware(request)
+
+    def test_list_views_read_from_replica(self):
+        """Ленты читают с реплики, остальные представления — с основной."""
+        for url, method, alias in (
+            (INDEX_URL, 'get', 'replica'),
+            (INDEX_URL, 'post', 'default'),
+            (CREATE_URL, 'get', 'default'),
+        ):
+            with self.subTest(url=url, method=method):
+                used, _ = self.serve(url, method=method)
+                self.assertEqual(used['read'], alias)
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи чтения пользователя идут в основную базу."""
+        used, response = self.serve(CREATE_URL, method='post', write=True)
+        self.assertEqual(used['write'], 'default')
+        self.assertIn(COOKIE, response.cookies)
+        cookie = response.cookies[COOKIE].value
+        used, response = self.serve(INDEX_URL, {COOKIE: cookie})
+        self.assertEqual(used['read'], 'default')
+        self.assertNotIn(COOKIE, response.cookies)
+        for expired in (str(time.time() - 1), 'мусор'):
+            with self.subTest(cookie=expired):
+                used, _ = self.serve(INDEX_URL, {COOKIE: expired})
+                self.assertEqual(used['read'], 'replica')
+
+    def test_follow_sets_sticky_cookie(self):
+        """Подписка через сайт включает чтение с основной базы."""
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        self.client.force_login(user)
+        response = self.client.get(
+            reverse('posts:profile_follow', args=[author.username])
+        )
+        self.assertTrue(Follow.objects.filter(user=user).exists())
+        self.assertIn(COOKIE, response.cookies)
+
+
+class StaleReplicaTests(TestCase):
+    databases = {'default', 'stale'}
+
+    @classmethod
+    def setUpClass(cls):
+        # Реплика — снимок пустой базы до теста: ни пользователя, ни его
+        # сессии в ней нет. Копируем до того, как TestCase откроет
+        # транзакцию, иначе снимок ждал бы её окончания.
+        cls.directory = tempfile.mkdtemp()
+        path = os.path.join(cls.directory, 'replica.sqlite3')
+        replica = sqlite3.connect(path)
+        connection.ensure_connection()
+        connection.connection.backup(replica)
+        replica.close()
+        connections.databases['stale'] = {
+            **connection.settings_dict, 'NAME': path
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['stale'].close()
+        del connections._connections.stale
+        del connections.databases['stale']
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader')
+        replicas = override_settings(DATABASE_REPLICAS=['stale'])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+    def test_login_survives_stale_replica(self):
+        """Сессия читается с основной базы, даже если реплика отстала."""
+        self.client.force_login(self.user)
+        for url in (reverse('posts:follow_index'), CREATE_URL):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_cached_index_is_rendered_from_primary(self):
+        """Страница для кеша и её ETag не берут данные с реплики."""
+        cache.clear()
+        post = Post.objects.create(author=self.user, text='Свежая запись')
+        response = self.client.get(INDEX_URL)
+        self.assertContains(response, post.text)
+        self.assertContains(self.client.get(INDEX_URL), post.text)
+        self.assertEqual(
+            self.client.get(
+                INDEX_URL, HTTP_IF_NONE_MATCH=response['ETag']
+            ).status_code,
+            304
+        )
+
+    def test_sync_replicas_resets_page_cache(self):
+        """После копирования страницы, нарисованные до него, устаревают."""
+        versions = get_version('index'), get_version(CONTENT)
+        with mock.patch(
+            'core.management.commands.sync_replicas.sqlite3'
+        ):
+            call_command('sync_replicas', stdout=StringIO())
+        self.assertNotEqual(
+            (get_version('index'), get_version(CONTENT)), versions
+        )
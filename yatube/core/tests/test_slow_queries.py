@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.slow_queries import normalize, redact
+from posts.models import Post, User
+
+PROFILE_URL = reverse('posts:profile', args=['author'])
+
+
+class NormalizeTests(SimpleTestCase):
+    def test_values_are_removed(self):
+        """Значения и списки параметров не влияют на отпечаток."""
+        self.assertEqual(
+            normalize(
+                "SELECT *  FROM \"t1\" WHERE a = 'x''y' AND b IN (%s, %s)"
+                "\n AND c > 10.5"
+            ),
+            'SELECT * FROM "t1" WHERE a = ? AND b IN (...) AND c > ?'
+        )
+
+    def test_params_are_redacted(self):
+        """От строк в журнале остаётся только длина."""
+        self.assertEqual(
+            redact(['secret', 5, None, b'12']),
+            ['<str:6>', 5, None, '<bytes:2>']
+        )
+        self.assertEqual(redact([[1], [2]], many=True), '<2 наборов>')
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_view_queries_are_logged_with_plan(self):
+        """Медленный запрос пишется с представлением, местом и планом."""
+        with self.assertLogs('core.slow_queries') as logs:
+            self.client.get(PROFILE_URL)
+        records = [json.loads(record.getMessage()) for record in logs.records]
+        author = next(
+            record for record in records
+            if record['sql'].startswith('SELECT')
+            and '"auth_user"."username" = ?' in record['sql']
+        )
+        self.assertEqual(author['source'], 'posts:profile')
+        self.assertEqual(author['params'], ['<str:6>'])
+        self.assertTrue(author['caller'].startswith('posts/'))
+        self.assertTrue(author['plan'])
+
+    def test_summary_command(self):
+        """Команда группирует записи по отпечатку и сортирует по времени."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'slow.log')
+        entries = [
+            ('aaa', 'SELECT 1', 'posts:index', 30),
+            ('bbb', 'SELECT 2', 'posts:profile', 50),
+            ('aaa', 'SELECT 1', 'posts:group_posts', 40),
+            ('ccc', 'SELECT 3', 'manage.py shell', 500),
+        ]
+        with open(path, 'w') as file:
+            for fingerprint, sql, source, duration in entries:
+                file.write(json.dumps({
+                    'fingerprint': fingerprint, 'sql': sql,
+                    'source': source, 'duration_ms': duration,
+                    'caller': None, 'plan': ['SCAN t'],
+                }) + '\n')
+        out = StringIO()
+        call_command('slow_queries', path, source='posts:', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('aaa  2 раз, всего 70.0 ms'))
+        self.assertIn('posts:group_posts, posts:index', lines[1])
+        self.assertNotIn('ccc', out.getvalue())
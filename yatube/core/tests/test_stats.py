@@ -0,0 +1,50 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+INDEX_URL = reverse('posts:index')
+
+
+class RequestStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(
+        REQUEST_STATS_SAMPLE_RATE=1, REQUEST_STATS_SLOW_MS=0,
+        REQUEST_STATS_TOP_QUERIES=2
+    )
+    def test_sampled_slow_request_is_logged_with_queries(self):
+        """Запрос из выборки пишется в лог со статистикой и SQL."""
+        with self.assertLogs('core.stats', 'WARNING') as logs:
+            response = self.client.get(INDEX_URL)
+        stats = response.wsgi_request.stats
+        self.assertGreater(stats.template_time, 0)
+        self.assertGreater(stats.cache_misses, 0)
+        self.assertGreater(stats.query_count, 2)
+        durations = [duration for duration, _ in stats.top_queries()]
+        self.assertEqual(len(durations), 2)
+        self.assertGreaterEqual(durations[0], durations[1])
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    @override_settings(REQUEST_STATS_SAMPLE_RATE=1)
+    def test_cache_hits_are_counted(self):
+        """Повторный запрос отдаётся из кеша и считается попаданием."""
+        self.client.get(INDEX_URL)
+        stats = self.client.get(INDEX_URL).wsgi_request.stats
+        self.assertGreater(stats.cache_hits, 0)
+        self.assertEqual(stats.template_time, 0)
+
+    @override_settings(REQUEST_STATS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_instrumented(self):
+        """Запрос вне выборки ничего не собирает и не пишет в лог."""
+        with self.assertNoLogs('core.stats', 'DEBUG'):
+            response = self.client.get(INDEX_URL)
+        self.assertIsNone(response.wsgi_request.stats)
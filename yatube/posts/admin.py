@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Follow, Post, Group, Comment
 
 
@@ -10,6 +11,11 @@ class PostAdmin(admin.ModelAdmin):
     list_editable = ('group',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
     class Meta:
         verbose_name = 'Записи'
 
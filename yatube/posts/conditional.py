@@ -0,0 +1,64 @@
+"""Валидаторы условных GET-запросов (ETag / Last-Modified).
+
+ETag складывается из версии содержимого (её сбрасывают сигналы при
+любой записи), пользователя и самой свежей даты в выборке страницы.
+Last-Modified — самая поздняя из этой даты и времени последней записи,
+поэтому удаление свежей записи тоже сдвигает его вперёд.
+"""
+import hashlib
+
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from core.caching import get_changed, get_version
+from core.routers import primary_reads
+from .models import Comment, Post
+
+CONTENT = 'content'
+
+
+def _latest(queryset, field):
+    latest = queryset.order_by().aggregate(latest=Max(field))['latest']
+    changed = get_changed(CONTENT)
+    return max(filter(None, (latest, changed)), default=None)
+
+
+def _etag(request, latest):
+    parts = (get_version(CONTENT), request.user.pk, latest)
+    return '"{}"'.format(
+        hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    )
+
+
+def conditional(scope):
+    """Декоратор: `scope(**kwargs)` даёт (queryset, поле даты) страницы."""
+    def last_modified(request, *args, **kwargs):
+        if not hasattr(request, '_latest_modified'):
+            # Валидаторы считаем по основной базе: с отставшей реплики
+            # клиент получил бы 304 на уже изменённую страницу.
+            with primary_reads():
+                request._latest_modified = _latest(*scope(**kwargs))
+        return request._latest_modified
+
+    return condition(
+        etag_func=lambda request, *args, **kwargs: _etag(
+            request, last_modified(request, *args, **kwargs)
+        ),
+        last_modified_func=last_modified
+    )
+
+
+def index_scope():
+    return Post.objects.all(), 'pub_date'
+
+
+def group_scope(slug):
+    return Post.objects.filter(group__slug=slug), 'pub_date'
+
+
+def profile_scope(username):
+    return Post.objects.filter(author__username=username), 'pub_date'
+
+
+def post_scope(post_id):
+    return Comment.objects.filter(post_id=post_id), 'created'
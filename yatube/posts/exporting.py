@@ -0,0 +1,102 @@
+"""Потоковая выгрузка записей и комментариев в CSV или JSONL.
+
+Таблица читается порциями по первичному ключу (`pk > последний`)
+через `iterator()`, строки сериализуются и, если нужно, сжимаются
+gzip по мере чтения, поэтому память не зависит от размера таблицы.
+Поля совпадают с форматом `import_content`.
+"""
+import csv
+import json
+import zlib
+
+from .models import Comment, Post
+
+EXPORTS = {
+    'post': (Post, {
+        'id': 'id',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'image': 'image',
+    }),
+    'comment': (Comment, {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+}
+FORMATS = ('csv', 'jsonl')
+
+
+def rows(name, chunk_size=2000):
+    """Кортежи значений полей выгрузки `name` в порядке первичного ключа."""
+    model, fields = EXPORTS[name]
+    lookups = list(fields.values())
+    last = None
+    while True:
+        queryset = model.objects.order_by('pk')
+        if last is not None:
+            queryset = queryset.filter(pk__gt=last)
+        count = 0
+        for row in queryset.values_list(*lookups)[:chunk_size].iterator():
+            count += 1
+            yield row
+        if count < chunk_size:
+            return
+        last = row[0]
+
+
+def _plain(row):
+    return [
+        value.isoformat() if hasattr(value, 'isoformat') else value
+        for value in row
+    ]
+
+
+class _Line:
+    """Файлоподобный приёмник для csv.writer: отдаёт записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def lines(name, file_format, chunk_size=2000):
+    """Строки выгрузки в формате `csv` (с заголовком) или `jsonl`."""
+    columns = list(EXPORTS[name][1])
+    if file_format == 'csv':
+        writer = csv.writer(_Line())
+        yield writer.writerow(columns)
+        for row in rows(name, chunk_size):
+            yield writer.writerow(_plain(row))
+        return
+    for row in rows(name, chunk_size):
+        yield json.dumps(
+            dict(zip(columns, _plain(row))), ensure_ascii=False
+        ) + '\n'
+
+
+def encode(chunks, compress=False, buffer_size=64 * 1024):
+    """Байты для отправки: строки склеиваются в блоки и сжимаются gzip."""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        data = chunk.encode()
+        buffer.append(data)
+        size += len(data)
+        if size < buffer_size:
+            continue
+        block = b''.join(buffer)
+        buffer, size = [], 0
+        if compressor is not None:
+            block = compressor.compress(block)
+        if block:
+            yield block
+    block = b''.join(buffer)
+    if compressor is not None:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
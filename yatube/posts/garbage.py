@@ -0,0 +1,173 @@
+"""Сборка мусора в MEDIA_ROOT: осиротевшие картинки и миниатюры.
+
+Картинка записи — мусор, если на неё не ссылается ни одна запись и
+нет счётчика `StoredImage`. Миниатюра — мусор, если её нет в хранилище
+ключей sorl. Свежие файлы (моложе `min_age` секунд) не трогаем: их
+может ещё сохранять незавершённая загрузка.
+
+Обход идёт в детерминированном порядке (файлы каталога по имени, затем
+подкаталоги), поэтому его можно прервать и продолжить с курсора — пути
+последнего проверенного файла в `MediaGarbageCursor`. Каждый каталог
+читается один раз за запуск: картинки и миниатюры разложены по
+подкаталогам хеша, так что каталоги невелики.
+"""
+import os
+import time
+from itertools import islice
+
+from django.conf import settings
+from sorl.thumbnail import default, delete as delete_thumbnails
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .models import MediaGarbageCursor, Post, StoredImage
+
+
+def _order(parts):
+    # Файл каталога идёт раньше его подкаталогов: (0, имя) < (1, имя).
+    return tuple((1, part) for part in parts[:-1]) + ((0, parts[-1]),)
+
+
+def _subtree_order(parts):
+    return tuple((1, part) for part in parts)
+
+
+def _listing(directory, top_directories):
+    """Файлы и подкаталоги каталога по имени, за одно чтение."""
+    files = []
+    subdirectories = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                files.append(entry.name)
+            elif entry.is_dir(follow_symlinks=False) and (
+                top_directories is None or entry.name in top_directories
+            ):
+                subdirectories.append(entry.name)
+    return sorted(files), sorted(subdirectories)
+
+
+def walk(root, top_directories, after=()):
+    """Пути файлов (списки частей) из каталогов `top_directories`."""
+    def visit(directory, parts):
+        files, subdirectories = _listing(
+            directory, None if parts else top_directories
+        )
+        if parts:
+            for name in files:
+                if _order(parts + [name]) > after:
+                    yield parts + [name]
+        for name in subdirectories:
+            prefix = _subtree_order(parts + [name])
+            if prefix < after[:len(prefix)]:
+                continue
+            yield from visit(os.path.join(directory, name), parts + [name])
+    if os.path.isdir(root):
+        yield from visit(root, [])
+
+
+def _load_cursor():
+    path = MediaGarbageCursor.objects.values_list('path', flat=True).first()
+    return _order(path.split('/')) if path else ()
+
+
+def _save_cursor(parts):
+    MediaGarbageCursor.objects.update_or_create(
+        pk=1, defaults={'path': '/'.join(parts)}
+    )
+
+
+def _referenced_images(names):
+    return set(
+        Post.objects.filter(image__in=names).values_list('image', flat=True)
+    ) | set(
+        StoredImage.objects.filter(name__in=names).values_list(
+            'name', flat=True
+        )
+    )
+
+
+def _referenced_thumbnails(names):
+    keys = {
+        add_prefix(ImageFile(name, default.storage).key): name
+        for name in names
+    }
+    return {
+        keys[key] for key in KVStore.objects.filter(
+            key__in=keys
+        ).values_list('key', flat=True)
+    }
+
+
+def _delete_image(name):
+    delete_thumbnails(ImageFile(name, Post._meta.get_field('image').storage))
+
+
+def _collect_chunk(chunk, images_directory, dry_run, deadline, result,
+                   on_orphan):
+    names = ['/'.join(parts) for parts in chunk]
+    images = {
+        name for name, parts in zip(names, chunk)
+        if parts[0] == images_directory
+    }
+    referenced = _referenced_images(images) | _referenced_thumbnails(
+        [name for name in names if name not in images]
+    )
+    for name in names:
+        if name in referenced:
+            continue
+        try:
+            stat = os.stat(os.path.join(settings.MEDIA_ROOT, name))
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime > deadline:
+            continue
+        result['orphans'] += 1
+        result['bytes'] += stat.st_size
+        if on_orphan is not None:
+            on_orphan(name, stat.st_size)
+        if dry_run:
+            continue
+        if name in images:
+            _delete_image(name)
+        else:
+            default.storage.delete(name)
+
+
+def collect(limit=None, dry_run=False, min_age=3600, batch_size=1000,
+            resume=True, on_orphan=None):
+    """Проходит MEDIA_ROOT с сохранённого курсора и удаляет мусор.
+
+    Для каждого найденного файла вызывается `on_orphan(имя, размер)`.
+    Возвращает словарь со счётчиками и признаком `finished`. Курсор
+    сохраняется в базе после каждой порции; после полного прохода он
+    сбрасывается. В режиме `dry_run` ничего не удаляется и курсор не
+    сдвигается.
+    """
+    images_directory = Post._meta.get_field('image').upload_to.strip('/')
+    files = walk(
+        settings.MEDIA_ROOT,
+        {images_directory, sorl_settings.THUMBNAIL_PREFIX.strip('/')},
+        _load_cursor() if resume else ()
+    )
+    deadline = time.time() - min_age
+    result = {'checked': 0, 'orphans': 0, 'bytes': 0, 'finished': False}
+    while limit is None or result['checked'] < limit:
+        size = batch_size
+        if limit is not None:
+            size = min(size, limit - result['checked'])
+        chunk = list(islice(files, size))
+        if not chunk:
+            result['finished'] = True
+            break
+        _collect_chunk(
+            chunk, images_directory, dry_run, deadline, result, on_orphan
+        )
+        result['checked'] += len(chunk)
+        if not dry_run:
+            _save_cursor(chunk[-1])
+    if result['finished'] and not dry_run:
+        MediaGarbageCursor.objects.all().delete()
+    return result
@@ -0,0 +1,69 @@
+"""Нормализация картинок записей при загрузке.
+
+Оригиналы с телефонов весят десятки мегабайт, а хранить и заново
+декодировать их для каждой миниатюры незачем. Перед сохранением
+картинка уменьшается до `POST_IMAGE_MAX_SIDE`, поворачивается по EXIF
+и пересохраняется с качеством `POST_IMAGE_QUALITY` уже без метаданных.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.forms import ValidationError
+from PIL import Image, ImageOps
+
+# Форматы, которые умеем пересохранять, и параметры кодировщика.
+SAVE_OPTIONS = {
+    'JPEG': {'quality': None, 'optimize': True, 'progressive': True},
+    'WEBP': {'quality': None, 'method': 4},
+    'PNG': {'optimize': True},
+    'GIF': {},
+}
+
+
+def _check_size(width, height):
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            f'Слишком большая картинка: {width}×{height} пикселей'
+        )
+
+
+def normalize(upload):
+    """Возвращает уменьшенную копию загруженной картинки без метаданных.
+
+    Размеры читаются из заголовка до декодирования, поэтому
+    «бомбы» отклоняются, не занимая память. Анимированные картинки и
+    форматы вне `SAVE_OPTIONS` сохраняются как есть.
+    """
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError('Слишком большая картинка')
+    with image:
+        _check_size(*image.size)
+        image_format = image.format
+        if (
+            image_format not in SAVE_OPTIONS
+            or getattr(image, 'is_animated', False)
+        ):
+            upload.seek(0)
+            return upload
+        max_side = settings.POST_IMAGE_MAX_SIDE
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе.
+        image.draft(image.mode, (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        options = dict(SAVE_OPTIONS[image_format])
+        if 'quality' in options:
+            options['quality'] = settings.POST_IMAGE_QUALITY
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+        # Кодировщики PNG и WebP сами копируют EXIF и XMP из info.
+        for key in ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment'):
+            image.info.pop(key, None)
+        buffer = BytesIO()
+        image.save(buffer, image_format, exif=b'', **options)
+    return SimpleUploadedFile(
+        upload.name, buffer.getvalue(), upload.content_type
+    )
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from posts import garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки без записей и миниатюры без ссылок в sorl. '
+        'Продолжает с места, где остановился прошлый запуск.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать мусор, ничего не удаляя'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Проверить не больше указанного числа файлов'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе указанного числа секунд'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько файлов проверять одним запросом к базе'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать обход заново, а не с сохранённого места'
+        )
+
+    def handle(self, *args, **options):
+        def report(name, size):
+            if options['verbosity'] > 1 or options['dry_run']:
+                self.stdout.write(f'{name} ({size} Б)')
+
+        result = garbage.collect(
+            limit=options['limit'],
+            dry_run=options['dry_run'],
+            min_age=options['min_age'],
+            batch_size=options['batch_size'],
+            resume=not options['restart'],
+            on_orphan=report
+        )
+        action = 'Найдено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {result["checked"]}. '
+            f'{action} лишних: {result["orphans"]} '
+            f'({result["bytes"]} Б).'
+        ))
+        if not result['finished']:
+            self.stdout.write('Обход не закончен, повторите команду.')
@@ -0,0 +1,41 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import exporting
+
+
+class Command(BaseCommand):
+    help = 'Выгружает записи или комментарии в CSV или JSONL потоком'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(exporting.EXPORTS))
+        parser.add_argument(
+            '--format', choices=exporting.FORMATS, default='jsonl'
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжать выгрузку gzip'
+        )
+        parser.add_argument(
+            '-o', '--output', help='Файл для выгрузки (по умолчанию stdout)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы одним запросом'
+        )
+
+    def handle(self, *args, **options):
+        blocks = exporting.encode(
+            exporting.lines(
+                options['model'], options['format'], options['chunk_size']
+            ),
+            options['gzip']
+        )
+        if options['output'] is None:
+            for block in blocks:
+                sys.stdout.buffer.write(block)
+            sys.stdout.buffer.flush()
+            return
+        with open(options['output'], 'wb') as output:
+            for block in blocks:
+                output.write(block)
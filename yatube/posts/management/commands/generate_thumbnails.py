@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит недостающие миниатюры для картинок всех записей'
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image='')
+            .values_list('image', flat=True).distinct().iterator()
+        )
+        count = 0
+        for name in names:
+            try:
+                thumbnails.generate(name)
+                thumbnails.refresh_pages(name)
+            except Exception as error:
+                self.stderr.write(f'{name}: {error}')
+                continue
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюры готовы для {count} картинок'
+        ))
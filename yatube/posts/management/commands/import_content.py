@@ -0,0 +1,106 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts import importing
+from posts.models import Comment, Follow, Group, Post
+
+MODELS = {
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует группы, записи, комментарии или подписки из JSONL '
+        'или CSV. Поля строк: group — slug, title, description; '
+        'post — author, text, group, pub_date, image, id; '
+        'comment — post, author, text, created; follow — user, author.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(MODELS))
+        parser.add_argument('path', help='Файл .jsonl или .csv')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат файла, если его не видно по расширению'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк писать одной транзакцией'
+        )
+        parser.add_argument(
+            '--keep-dates', action='store_true',
+            help='Брать pub_date и created из файла, а не текущее время'
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Заводить неизвестных пользователей без пароля'
+        )
+        parser.add_argument(
+            '--show-errors', type=int, default=20,
+            help='Сколько причин пропуска строк вывести'
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='Не сбрасывать кеш страниц после импорта '
+                 '(если дальше идут другие файлы)'
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(
+            options['path']
+        )[1].lstrip('.').lower()
+        if file_format not in ('jsonl', 'csv'):
+            raise CommandError('Укажите --format: jsonl или csv')
+        importer = importing.Importer(
+            create_users=options['create_users'],
+            keep_dates=options['keep_dates']
+        )
+        started = time.monotonic()
+        done = {'created': 0, 'errors': 0}
+
+        def progress(created, skipped):
+            done['created'] = created
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Создано: {created}, пропущено: {skipped}, '
+                f'{(created + skipped) / max(elapsed, 1e-6):.0f} строк/с'
+            )
+
+        def reject(number, reason):
+            done['errors'] += 1
+            if done['errors'] <= options['show_errors']:
+                self.stderr.write(f'Строка {number} пропущена: {reason}')
+
+        try:
+            with open(options['path'], encoding='utf-8', newline='') as file:
+                created, skipped = importer.import_rows(
+                    MODELS[options['model']],
+                    importing.read_rows(file, file_format),
+                    options['chunk_size'],
+                    progress,
+                    reject
+                )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        except IntegrityError as error:
+            # Предыдущие порции уже зафиксированы: говорим, сколько.
+            raise CommandError(
+                f'Порция не записана ({error}); до неё создано '
+                f'{done["created"]} строк'
+            )
+        hidden = done['errors'] - options['show_errors']
+        if hidden > 0:
+            self.stderr.write(f'Причины не выведены ещё для {hidden} строк')
+        if not options['skip_rebuild']:
+            importing.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт закончен за {time.monotonic() - started:.1f} с: '
+            f'создано {created}, пропущено {skipped}'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import media
+from posts.models import StoredImage
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает ссылки записей на файлы картинок'
+
+    def handle(self, *args, **options):
+        media.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов с картинками: {StoredImage.objects.count()}'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+from posts.models import UserStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики пользователей с нуля'
+
+    def handle(self, *args, **options):
+        stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано пользователей: {UserStats.objects.count()}'
+        ))
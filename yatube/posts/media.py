@@ -0,0 +1,84 @@
+"""Счётчики ссылок на файлы картинок записей.
+
+Хранилище `ContentAddressedStorage` отдаёт один файл всем записям с
+одинаковой картинкой, поэтому удалить файл (и его миниатюры) можно
+только когда на него не ссылается ни одна запись. Счётчики обновляют
+сигналы; `bulk_create` и `update` их не трогают — после массовых
+изменений вызывайте `rebuild`.
+"""
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import Count, F
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post, StoredImage
+
+logger = logging.getLogger(__name__)
+
+
+def retain(name):
+    if not name:
+        return
+    with transaction.atomic():
+        StoredImage.objects.get_or_create(name=name)
+        StoredImage.objects.filter(name=name).update(
+            references=F('references') + 1
+        )
+
+
+def retain_many(counts):
+    """Как `retain`, но сразу для многих файлов: {имя: число ссылок}."""
+    with transaction.atomic():
+        StoredImage.objects.bulk_create(
+            [StoredImage(name=name) for name in counts],
+            batch_size=500,
+            ignore_conflicts=True
+        )
+        for name, count in counts.items():
+            StoredImage.objects.filter(name=name).update(
+                references=F('references') + count
+            )
+
+
+def release(name):
+    """Уменьшает счётчик и удаляет файл, если ссылок не осталось."""
+    if not name:
+        return
+    with transaction.atomic():
+        StoredImage.objects.filter(name=name, references__gt=0).update(
+            references=F('references') - 1
+        )
+        deleted, _ = StoredImage.objects.filter(
+            name=name, references=0
+        ).delete()
+    if deleted:
+        transaction.on_commit(lambda: _delete_file(name))
+
+
+def _delete_file(name):
+    # Пока транзакция фиксировалась, тот же файл могли загрузить снова.
+    if StoredImage.objects.filter(name=name).exists():
+        return
+    storage = Post._meta.get_field('image').storage
+    try:
+        delete_thumbnails(ImageFile(name, storage))
+    except (OSError, SuspiciousFileOperation):
+        logger.exception('Не удалось удалить картинку %s', name)
+
+
+@transaction.atomic
+def rebuild():
+    """Пересчитывает все счётчики по таблице записей."""
+    StoredImage.objects.all().delete()
+    StoredImage.objects.bulk_create(
+        [
+            StoredImage(name=name, references=count)
+            for name, count in Post.objects.exclude(image='').exclude(
+                image=None
+            ).order_by().values_list('image').annotate(count=Count('pk'))
+        ],
+        batch_size=500
+    )
@@ -0,0 +1,58 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:38
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+COUNTERS = {
+    'posts_count': ('Post', 'author_id'),
+    'followers_count': ('Follow', 'author_id'),
+    'following_count': ('Follow', 'user_id'),
+    'comments_count': ('Comment', 'author_id'),
+}
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserStats = apps.get_model('posts', 'UserStats')
+    counts = {}
+    for field, (model_name, user_field) in COUNTERS.items():
+        model = apps.get_model('posts', model_name)
+        for user_id, count in model.objects.order_by().values_list(
+            user_field
+        ).annotate(count=Count('pk')):
+            counts.setdefault(user_id, {})[field] = count
+    UserStats.objects.bulk_create(
+        [
+            UserStats(user_id=user_id, **counts.get(user_id, {}))
+            for user_id in User.objects.values_list('pk', flat=True)
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0005_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:59
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+import django.db.models.expressions
+
+
+def remove_bad_follows(apps, schema_editor):
+    """Удаляет дубли подписок и подписки на себя перед ограничениями."""
+    Follow = apps.get_model('posts', 'Follow')
+    Timeline = apps.get_model('posts', 'Timeline')
+    UserStats = apps.get_model('posts', 'UserStats')
+    affected = set()
+    for pair in Follow.objects.filter(user=F('author')).values_list(
+        'user_id', 'author_id'
+    ):
+        affected.update(pair)
+    Follow.objects.filter(user=F('author')).delete()
+    Timeline.objects.filter(user=F('post__author')).delete()
+    duplicates = Follow.objects.order_by().values(
+        'user_id', 'author_id'
+    ).annotate(first=Min('pk'), count=Count('pk')).filter(count__gt=1)
+    for duplicate in duplicates:
+        Follow.objects.filter(
+            user_id=duplicate['user_id'], author_id=duplicate['author_id']
+        ).exclude(pk=duplicate['first']).delete()
+        affected.update((duplicate['user_id'], duplicate['author_id']))
+    for user_id in affected:
+        UserStats.objects.filter(user_id=user_id).update(
+            followers_count=Follow.objects.filter(author_id=user_id).count(),
+            following_count=Follow.objects.filter(user_id=user_id).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_stored_image'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='timeline',
+            name='timeline_user_pub_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pub_date'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'pub_date'], name='post_group_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeline',
+            index=models.Index(fields=['user', 'pub_date'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.RunPython(remove_bad_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='follow_unique_user_author'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='follow_not_self'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes_follow_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaGarbageCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, verbose_name='Последний проверенный файл')),
+            ],
+            options={
+                'verbose_name': 'Курсор сборщика мусора',
+                'verbose_name_plural': 'Курсоры сборщика мусора',
+            },
+        ),
+    ]
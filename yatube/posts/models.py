@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from django.db import models
 from django.forms import ValidationError
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -22,6 +24,21 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_cards(self):
+        """Записи для карточек: автор и группа одним JOIN без лишних полей."""
+        return self.select_related('author', 'group').defer(
+            'author__password',
+            'author__last_login',
+            'author__is_superuser',
+            'author__email',
+            'author__is_staff',
+            'author__is_active',
+            'author__date_joined',
+            'group__description',
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст',
@@ -49,15 +66,30 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True,
         help_text='Картинка иллюстрирующая запись'
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
+        # Ленты сортируются по (-pub_date, -id). В индексе SQLite после
+        # полей неявно идёт rowid (= id), поэтому обратный проход по
+        # возрастающему индексу выдаёт записи ровно в этом порядке.
+        indexes = [
+            models.Index(fields=('pub_date',), name='post_pub_date_idx'),
+            models.Index(
+                fields=('author', 'pub_date'), name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', 'pub_date'), name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -86,6 +118,7 @@ class Comment(models.Model):
     )
 
     class Meta:
+        ordering = ('created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -114,3 +147,95 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='follow_unique_user_author'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='follow_not_self'
+            ),
+        ]
+
+
+class Timeline(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='Читатель',
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name='Запись',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        unique_together = ('user', 'post')
+        indexes = [
+            # По возрастанию: см. комментарий к индексам Post.
+            models.Index(
+                fields=('user', 'pub_date'),
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Записей', default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков', default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Подписок', default=0
+    )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Комментариев', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+
+class StoredImage(models.Model):
+    name = models.CharField(
+        verbose_name='Файл', max_length=100, primary_key=True
+    )
+    references = models.PositiveIntegerField(
+        verbose_name='Записей с картинкой', default=0
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
+
+
+class MediaGarbageCursor(models.Model):
+    path = models.CharField(
+        verbose_name='Последний проверенный файл', max_length=255
+    )
+
+    class Meta:
+        verbose_name = 'Курсор сборщика мусора'
+        verbose_name_plural = 'Курсоры сборщика мусора'
+
+    def __str__(self):
+        return self.path
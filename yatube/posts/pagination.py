@@ -0,0 +1,168 @@
+"""Пагинация по ключу (keyset/cursor) для лент записей.
+
+Вместо `COUNT(*)` и `OFFSET` страница выбирается условием по паре
+ключей сортировки последней показанной записи, поэтому глубокие
+страницы стоят столько же, сколько первая.
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import DateTimeField, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_aware
+
+POST_KEYS = ('pub_date', 'id')
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(values, direction):
+    data = json.dumps([direction, *(
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    )])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (направление, значения) или None для битого курсора."""
+    try:
+        data = json.loads(
+            base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        )
+        direction, *values = data
+    except (ValueError, TypeError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not values:
+        return None
+    if any(
+        isinstance(value, bool) or not isinstance(value, (str, int, float))
+        for value in values
+    ):
+        return None
+    return direction, [
+        parse_datetime(value) or value if isinstance(value, str) else value
+        for value in values
+    ]
+
+
+class CursorPage(Page):
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def make_cursor_page(objects, values, per_page, forward, from_cursor,
+                     paginator=None):
+    """Собирает CursorPage из выборки на `per_page + 1` строк.
+
+    `objects` идут в порядке обхода (для шага назад — в обратном),
+    `values(obj)` возвращает ключи сортировки объекта.
+    """
+    has_more = len(objects) > per_page
+    objects = objects[:per_page]
+    if not forward:
+        objects.reverse()
+    has_next = has_more if forward else True
+    has_previous = from_cursor and (has_more or forward)
+    return CursorPage(
+        objects,
+        paginator,
+        encode_cursor(values(objects[-1]), NEXT)
+        if objects and has_next else None,
+        encode_cursor(values(objects[0]), PREVIOUS)
+        if objects and has_previous else None,
+    )
+
+
+class CursorPaginator(Paginator):
+    """Paginator, умеющий отдавать страницы и по номеру, и по курсору.
+
+    `keys` — поля сортировки (последнее должно быть уникальным), по
+    которым строится условие перехода к соседней странице.
+    """
+
+    def __init__(self, object_list, per_page, keys=POST_KEYS,
+                 descending=True, **kwargs):
+        self.keys = keys
+        self.descending = descending
+        super().__init__(
+            object_list.order_by(*self._ordering(descending)),
+            per_page,
+            **kwargs
+        )
+
+    def _ordering(self, descending):
+        prefix = '-' if descending else ''
+        return [prefix + key for key in self.keys]
+
+    def _values(self, obj):
+        return [getattr(obj, key) for key in self.keys]
+
+    def _clean(self, values):
+        """Ключи из курсора, приведённые к типам полей сортировки."""
+        if len(values) != len(self.keys):
+            raise ValueError(values)
+        cleaned = []
+        for key, value in zip(self.keys, values):
+            field = self.object_list.model._meta.get_field(key)
+            # Дата в курсоре — только строка с часовым поясом, а не число.
+            if isinstance(field, DateTimeField) and not (
+                isinstance(value, datetime) and is_aware(value)
+            ):
+                raise ValueError(value)
+            cleaned.append(field.to_python(value))
+        return cleaned
+
+    def _after(self, values, forward):
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for index, key in enumerate(self.keys):
+            equal = dict(zip(self.keys[:index], values[:index]))
+            condition |= Q(**equal, **{f'{key}__{lookup}': values[index]})
+        return condition
+
+    def page(self, number):
+        page = super().page(number)
+        page.next_cursor = (
+            encode_cursor(self._values(page[-1]), NEXT)
+            if page.has_next() else None
+        )
+        return page
+
+    def cursor_page(self, cursor):
+        """Страница после (или перед) записью, закодированной в курсоре."""
+        decoded = decode_cursor(cursor) if cursor else None
+        queryset, forward = self.object_list, True
+        if decoded is not None:
+            direction, values = decoded
+            forward = direction == NEXT
+            try:
+                queryset = queryset.filter(
+                    self._after(self._clean(values), forward)
+                )
+            except (ValueError, TypeError, ValidationError):
+                queryset, forward, decoded = self.object_list, True, None
+        if not forward:
+            queryset = queryset.order_by(*self._ordering(not self.descending))
+        return make_cursor_page(
+            list(queryset[:self.per_page + 1]),
+            self._values,
+            self.per_page,
+            forward,
+            decoded is not None,
+            self
+        )
@@ -0,0 +1,145 @@
+"""Полнотекстовый поиск по записям на SQLite FTS5.
+
+Текст записей копируется в виртуальную таблицу `posts_post_fts`
+сигналами при сохранении и удалении. Запрос пользователя разбивается
+на слова, каждое ищется как префикс, результаты ранжируются bm25 и
+листаются курсором по паре (rank, id). На других СУБД поиск
+откатывается к `icontains`.
+"""
+import re
+
+from django.db import connection, transaction
+
+from .models import Post
+from .pagination import (
+    NEXT, CursorPage, CursorPaginator, decode_cursor, make_cursor_page
+)
+
+FTS_TABLE = 'posts_post_fts'
+BATCH_SIZE = 500
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_query(text):
+    """Превращает ввод пользователя в запрос FTS5 из префиксов слов."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def index_post(post):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text]
+        )
+
+
+def unindex_post(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def index_posts(post_ids):
+    """Как `index_post`, но сразу для многих записей (после импорта)."""
+    if not is_available():
+        return
+    post_ids = list(post_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(post_ids), BATCH_SIZE):
+            batch = post_ids[start:start + BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                batch
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table} '
+                f'WHERE id IN ({placeholders})',
+                batch
+            )
+
+
+def rebuild():
+    """Заново заполняет индекс из таблицы записей."""
+    if not is_available():
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            f'SELECT id, text FROM {Post._meta.db_table}'
+        )
+
+
+def matching(queryset, text):
+    """Сужает queryset записей до найденных по тексту (без ранжирования)."""
+    query = build_query(text)
+    if not query:
+        return queryset.none()
+    if not is_available():
+        return queryset.filter(text__icontains=text)
+    # Не filter(id__in=RawSQL(...)): Django обрамляет подзапрос вторыми
+    # скобками, и SQLite сравнивает id лишь с первой найденной строкой.
+    return queryset.extra(
+        where=[
+            f'{Post._meta.db_table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[query]
+    )
+
+
+def search_page(text, cursor, per_page):
+    """Страница результатов поиска, лучшие совпадения первыми."""
+    query = build_query(text)
+    if not query:
+        return CursorPage([], None, None, None)
+    if not is_available():
+        return CursorPaginator(
+            matching(Post.objects.for_cards(), text), per_page
+        ).cursor_page(cursor)
+    decoded = decode_cursor(cursor) if cursor else None
+    sql = (
+        f'SELECT id, rank FROM (SELECT rowid AS id, rank FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s)'
+    )
+    params = [query]
+    forward = True
+    if decoded is not None:
+        direction, values = decoded
+        if len(values) == 2 and all(
+            isinstance(value, (int, float)) for value in values
+        ):
+            forward = direction == NEXT
+            operator = '>' if forward else '<'
+            sql += (
+                f' WHERE rank {operator} %s '
+                f'OR (rank = %s AND id {operator} %s)'
+            )
+            params += [values[0], values[0], values[1]]
+        else:
+            decoded = None
+    order = 'ASC' if forward else 'DESC'
+    sql += f' ORDER BY rank {order}, id {order} LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    page = make_cursor_page(
+        rows,
+        lambda row: [row[1], row[0]],
+        per_page,
+        forward,
+        decoded is not None
+    )
+    posts = Post.objects.for_cards().in_bulk([row[0] for row in page])
+    page.object_list = [posts[row[0]] for row in page if row[0] in posts]
+    return page
@@ -0,0 +1,127 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.caching import bump_version
+from . import media, search, stats, thumbnails, timeline
+from .conditional import CONTENT
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_backfill(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_prune(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def user_stats_create(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_stats_add(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def post_stats_remove(sender, instance, **kwargs):
+    stats.change(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_stats_add(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change(instance.author_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_stats_remove(sender, instance, **kwargs):
+    stats.change(instance.author_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_stats_add(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change(instance.author_id, followers_count=1)
+        stats.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_stats_remove(sender, instance, **kwargs):
+    stats.change(instance.author_id, followers_count=-1)
+    stats.change(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_index(sender, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login: на ленту не влияет.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    bump_version('index', CONTENT)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_content(sender, **kwargs):
+    bump_version(CONTENT)
+
+
+@receiver(post_save, sender=Post)
+def post_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_search_unindex(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def post_image_remember(sender, instance, raw=False, update_fields=None,
+                        **kwargs):
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        instance._previous_image = instance.image.name or None
+    elif instance.pk is None:
+        instance._previous_image = None
+    else:
+        instance._previous_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('image', flat=True).first() or None
+
+
+@receiver(post_save, sender=Post)
+def post_image_references(sender, instance, raw=False, **kwargs):
+    previous = instance._previous_image
+    current = instance.image.name or None
+    if not raw and previous != current:
+        media.retain(current)
+        media.release(previous)
+        # Шаблоны выводят только готовые миниатюры, поэтому строим их при
+        # любом сохранении новой картинки: из формы, админки или импорта.
+        thumbnails.schedule(instance.image)
+
+
+@receiver(post_delete, sender=Post)
+def post_image_release(sender, instance, **kwargs):
+    media.release(instance.image.name)
@@ -0,0 +1,85 @@
+"""Денормализованные счётчики пользователя для профиля и записи.
+
+Счётчики меняются сигналами вместе с записями, подписками и
+комментариями, а `rebuild` пересчитывает их с нуля.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Comment, Follow, Post, User, UserStats
+
+COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+    'comments_count': (Comment, 'author_id'),
+}
+
+
+def _counts(user_ids=None):
+    """Возвращает {user_id: {поле: значение}} по данным таблиц."""
+    stats = {}
+    for field, (model, user_field) in COUNTERS.items():
+        queryset = model.objects.order_by()
+        if user_ids is not None:
+            queryset = queryset.filter(**{f'{user_field}__in': user_ids})
+        for user_id, count in queryset.values_list(user_field).annotate(
+            count=Count('pk')
+        ):
+            stats.setdefault(user_id, {})[field] = count
+    return stats
+
+
+def change(user_id, **deltas):
+    """Сдвигает счётчики пользователя.
+
+    Отсутствующая запись не создаётся: её восстановит `rebuild`.
+    """
+    UserStats.objects.filter(user_id=user_id).update(**{
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    })
+
+
+def refresh_many(user_ids, batch_size=500):
+    """Пересчитывает счётчики нескольких пользователей (после импорта)."""
+    user_ids = list(user_ids)
+    counts = _counts(user_ids)
+    with transaction.atomic():
+        UserStats.objects.filter(user_id__in=user_ids).delete()
+        UserStats.objects.bulk_create(
+            [
+                UserStats(user_id=user_id, **counts.get(user_id, {}))
+                for user_id in user_ids
+            ],
+            batch_size=batch_size
+        )
+
+
+def get(user):
+    """Счётчики пользователя; чтение никогда не пишет в базу.
+
+    Записи создают сигнал и импорт. Если записи всё же нет, отдаём
+    несохранённые нули, а не создаём её из GET-запроса.
+    """
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        # user_id, а не user: присвоение связи спрашивает у роутера базу
+        # для записи, и тот счёл бы запрос пишущим.
+        return UserStats(user_id=user.pk)
+
+
+@transaction.atomic
+def rebuild(batch_size=500):
+    """Пересобирает счётчики всех пользователей с нуля."""
+    counts = _counts()
+    UserStats.objects.all().delete()
+    UserStats.objects.bulk_create(
+        (
+            UserStats(user_id=user_id, **counts.get(user_id, {}))
+            for user_id in User.objects.values_list('pk', flat=True)
+        ),
+        batch_size=batch_size
+    )
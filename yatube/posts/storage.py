@@ -0,0 +1,61 @@
+"""Хранилище картинок, адресуемое по содержимому.
+
+Файл называется по SHA-256 своего содержимого, поэтому одинаковые
+загрузки ложатся в один файл, а sorl строит для него одни миниатюры на
+все записи. Файлы раскладываются по 256 подкаталогам по первым двум
+знакам хеша, чтобы ни один каталог не разрастался. Когда файл можно
+удалить, решает счётчик ссылок `StoredImage` (см. `posts.media`), а не
+хранилище.
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        """Имя `<каталог>/<ab>/<sha256>.<расширение>` для содержимого."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = digest.hexdigest()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(
+            self.content_name(name, content), content, max_length
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # Совпадение имён значит совпадение содержимого: файл переиспользуем.
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(
+                f'Имя файла {name} длиннее {max_length} символов'
+            )
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        # Пишем во временный файл и атомарно переименовываем, чтобы
+        # параллельная загрузка того же файла не увидела его недописанным.
+        directory, filename = os.path.split(name)
+        temporary = super()._save(
+            os.path.join(directory, f'.{uuid.uuid4().hex}.{filename}'),
+            content
+        )
+        os.replace(self.path(temporary), self.path(name))
+        return name
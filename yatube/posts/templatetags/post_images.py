@@ -0,0 +1,34 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+CARD_SIZES = '(min-width: 992px) 960px, 100vw'
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(image, name, sizes=CARD_SIZES):
+    """Адаптивная картинка записи из заранее построенных вариантов."""
+    found = thumbnails.lookup(image, name)
+    if found is None:
+        if not image:
+            return {'picture': None}
+        thumbnails.note_missing(image)
+        return {'picture': None, 'original': image}
+    srcsets = {
+        image_format: ', '.join(
+            f'{thumbnail.url} {width}w' for thumbnail, width in variants
+        )
+        for image_format, variants in found['srcsets'].items()
+    }
+    return {
+        'picture': found['fallback'],
+        'srcset': srcsets.pop(thumbnails.FALLBACK_FORMAT),
+        'sources': [
+            {'type': MIME_TYPES[image_format], 'srcset': srcset}
+            for image_format, srcset in srcsets.items()
+        ],
+        'sizes': sizes,
+    }
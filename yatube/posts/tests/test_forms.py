@@ -1,13 +1,16 @@
+import hashlib
 import shutil
 import tempfile
+from io import BytesIO
 
 from django import forms
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
-from posts.models import Post, Group, User, Comment
+from posts.models import Post, Group, User, Comment, StoredImage
 from posts.tests.test_urls import authorisation_redirect
 
 USERNAME = 'username'
@@ -35,6 +38,26 @@ SMALL_GIF = (
 )
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 POST_IMAGE = Post._meta.get_field("image").upload_to
+EXIF_ORIENTATION = 0x0112
+EXIF_ROTATE_90 = 6
+EXIF_MAKE = 0x010F
+
+
+def content_name(image):
+    with image.open('rb'):
+        digest = hashlib.sha256(image.read()).hexdigest()
+    return f'{POST_IMAGE}{digest[:2]}/{digest}.gif'
+
+
+def make_photo(name, size, image_format='JPEG'):
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = EXIF_ROTATE_90
+    exif[EXIF_MAKE] = 'SecretCam'
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, image_format, exif=exif)
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), f'image/{image_format.lower()}'
+    )
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -106,10 +129,7 @@ class PostsFormTests(TestCase):
         self.assertEqual(post.text, post_form['text'])
         self.assertEqual(post.group.id, post_form['group'])
         self.assertEqual(post.author, self.user)
-        self.assertEqual(
-            post.image.name,
-            f'{POST_IMAGE}{post_form["image"].name}'
-        )
+        self.assertEqual(post.image.name, content_name(post.image))
         self.assertRedirects(request, PROFILE_URL)
 
     def test_create_post_guest(self):
@@ -144,10 +164,7 @@ class PostsFormTests(TestCase):
         self.assertEqual(post.text, post_form['text'])
         self.assertEqual(post.group.id, post_form['group'])
         self.assertEqual(post.author, self.post.author)
-        self.assertEqual(
-            post.image.name,
-            f'{POST_IMAGE}{post_form["image"].name}'
-        )
+        self.assertEqual(post.image.name, content_name(post.image))
         self.assertRedirects(response, self.POST_DETAIL_URL)
 
     def test_edit_post_not_author(self):
@@ -223,3 +240,63 @@ class PostsFormTests(TestCase):
         self.assertEqual(comment.author, self.user)
         self.assertEqual(comment.text, post_form['text'])
         self.assertEqual(comment.post, self.post)
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_create_post_normalizes_image(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет его."""
+        self.user_client.post(POST_CREATE_URL, data={
+            'text': TEXT_NEW,
+            'image': make_photo('photo.jpg', (400, 200))
+        })
+        post = Post.objects.get(text=TEXT_NEW)
+        with Image.open(post.image) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (50, 100))
+            self.assertNotIn(EXIF_ORIENTATION, image.getexif())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_create_post_strips_png_metadata(self):
+        """PNG тоже пересохраняется без EXIF."""
+        self.user_client.post(POST_CREATE_URL, data={
+            'text': TEXT_NEW,
+            'image': make_photo('photo.png', (400, 200), 'PNG')
+        })
+        post = Post.objects.get(text=TEXT_NEW)
+        with Image.open(post.image) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertEqual(image.size, (50, 100))
+            self.assertNotIn('exif', image.info)
+            self.assertNotIn(EXIF_MAKE, image.getexif())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_create_post_rejects_huge_image(self):
+        """Слишком большая картинка отклоняется формой."""
+        posts_count = Post.objects.count()
+        response = self.user_client.post(POST_CREATE_URL, data={
+            'text': TEXT_NEW,
+            'image': make_photo('huge.jpg', (100, 100))
+        })
+        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertTrue(response.context['form'].has_error('image'))
+
+    def test_same_image_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом со счётчиком ссылок."""
+        posts = [
+            Post.objects.create(
+                text=TEXT_NEW,
+                author=self.user,
+                image=SimpleUploadedFile(f'copy{i}.gif', SMALL_GIF)
+            ) for i in range(2)
+        ]
+        name = posts[0].image.name
+        self.assertEqual(posts[1].image.name, name)
+        references = StoredImage.objects.get(name=name).references
+        posts[0].delete()
+        self.assertEqual(
+            StoredImage.objects.get(name=name).references, references - 1
+        )
+        posts[1].image = None
+        posts[1].save()
+        self.assertEqual(
+            StoredImage.objects.get(name=name).references, references - 2
+        )
@@ -1,12 +1,27 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest import mock
 
-from ..models import Group, Post, User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Follow, Group, Post, User
+from ..pagination import CursorPaginator
 
 USERNAME = 'user'
 GROUP_SLUG = 'test_group'
 GROUP_TITLE = 'Тестовый заголовок'
 GROUP_DESCRIPTION = 'Тестовое описание'
 POST_TEXT = 'Тестовый текст'
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
 
 
 class PostModelTest(TestCase):
@@ -61,3 +76,76 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     Post._meta.get_field(field).help_text, expected_value)
+
+
+class FeedQueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title=GROUP_TITLE, slug=GROUP_SLUG, description=GROUP_DESCRIPTION
+        )
+
+    def test_feeds_scan_indexes_without_sorting(self):
+        """Ленты читаются по индексу, без сортировки во временном B-дереве."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Планы запросов проверяются на SQLite')
+        feeds = {
+            'index': Post.objects.for_cards(),
+            'group': self.group.posts.for_cards(),
+            'profile': self.author.posts.for_cards(),
+            'follow': self.user.timeline.only('user', 'post', 'pub_date'),
+        }
+        for name, queryset in feeds.items():
+            paginator = CursorPaginator(queryset, 10)
+            pages = {
+                'first': paginator.object_list,
+                'next': paginator.object_list.filter(
+                    paginator._after([timezone.now(), 1], True)
+                ),
+            }
+            for page, page_queryset in pages.items():
+                with self.subTest(feed=name, page=page):
+                    plan = page_queryset[:11].explain()
+                    self.assertIn('USING INDEX', plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FollowConstraintTest(TestCase):
+    def test_follow_pairs_are_unique_and_not_self(self):
+        """База не даёт подписаться дважды или на самого себя."""
+        user = User.objects.create_user(username=USERNAME)
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=user, author=author)
+        for follow_author in (author, user):
+            with self.subTest(author=follow_author.username):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        Follow.objects.create(user=user, author=follow_author)
+
+
+class ThumbnailScheduleTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    @mock.patch('posts.signals.thumbnails.schedule')
+    def test_any_save_with_new_image_schedules_thumbnails(self, schedule):
+        """Миниатюры ставятся в очередь при любом сохранении картинки."""
+        post = Post(text='Текст', author=self.user, image=SimpleUploadedFile(
+            'small.gif', SMALL_GIF, content_type='image/gif'
+        ))
+        post.save()
+        schedule.assert_called_once_with(post.image)
+        schedule.reset_mock()
+        post.text = 'Новый текст'
+        post.save()
+        schedule.assert_not_called()
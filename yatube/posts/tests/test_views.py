@@ -1,19 +1,31 @@
+import os
+import base64
+import gzip
+import json
 import shutil
 import tempfile
+from io import StringIO
 
 from django.test import Client, TestCase, override_settings
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from posts.models import Follow, Post, Group, User
-from yatube.settings import POSTS_PER_PAGE
+from core.caching import get_version
+from posts import garbage, search, thumbnails
+from posts.models import (
+    Comment, Follow, Group, MediaGarbageCursor, Post, StoredImage, Timeline,
+    User, UserStats
+)
+from yatube.settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
 
 USERNAME = 'username'
 FOLLOWER_USERNAME = 'follower'
 UNFOLLOWER_USERNAME = 'unfollower'
 POST_TEXT = 'Тестовый текст'
+NEW_POST_TEXT = 'Новый тестовый текст'
 GROUP_SLUG = 'test_group'
 GROUP_TITLE = 'Тестовый заголовок'
 GROUP_DESCRIPTION = 'Тестовое описание'
@@ -21,6 +33,7 @@ POST_CREATE_URL = reverse('posts:post_create')
 PROFILE_URL = reverse('posts:profile', args=[USERNAME])
 GROUP_URL = reverse('posts:group_posts', args=[GROUP_SLUG])
 MAIN_PAGE_URL = reverse('posts:index')
+SEARCH_URL = reverse('posts:search')
 AUTHORISATION_URL = reverse('users:login')
 NEW_GROUP_SLUG = 'new_group'
 NEW_GROUP_TITLE = 'Новый тестовый заголовок'
@@ -160,23 +173,481 @@ class PostsPagesTests(TestCase):
                     posts_on_page
                 )
 
+    def test_cursor_pagination(self):
+        """Курсор ведёт на соседние страницы без пропусков и повторов."""
+        Post.objects.bulk_create(
+            [Post(
+                text=f'{POST_TEXT} {i+1}',
+                author=self.user,
+                group=self.group
+            ) for i in range(POSTS_PER_PAGE)]
+        )
+        expected = list(
+            Post.objects.filter(group=self.group).order_by('-pub_date', '-id')
+        )
+        for url in [GROUP_URL, PROFILE_URL]:
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                second = self.client.get(
+                    f'{url}?cursor={first.next_cursor}'
+                ).context['page_obj']
+                self.assertEqual(list(first) + list(second), expected)
+                self.assertFalse(second.has_next())
+                previous = self.client.get(
+                    f'{url}?cursor={second.previous_cursor}'
+                ).context['page_obj']
+                self.assertEqual(list(previous), list(first))
+                self.assertFalse(previous.has_previous())
+
+    def test_malformed_cursor(self):
+        """Битый курсор открывает первую страницу, а не ошибку сервера."""
+        tokens = [
+            base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+            for data in (
+                ['n', 5, 3], ['n', True, 1], ['n', {}, 1], ['n', [], 1],
+                ['n', '2022-01-01T00:00:00', 1], ['n', 'дата', 1],
+                ['n', '2022-01-01T00:00:00+00:00', 'id'], ['x', 1, 1]
+            )
+        ] + ['не-base64', base64.urlsafe_b64encode(b'{').decode()]
+        urls = (MAIN_PAGE_URL, GROUP_URL, PROFILE_URL, FOLLOW_INDEX_URL)
+        for url in urls:
+            for token in tokens:
+                with self.subTest(url=url, token=token):
+                    cache.clear()
+                    response = self.follower_client.get(
+                        url, {'cursor': token}
+                    )
+                    self.assertEqual(response.status_code, 200)
+                    self.assertFalse(
+                        response.context['page_obj'].has_previous()
+                    )
+
+    def test_list_pages_query_count(self):
+        """Число запросов страницы не зависит от количества карточек."""
+        Post.objects.bulk_create(
+            [Post(
+                text=f'{POST_TEXT} {i+1}',
+                author=self.user,
+                group=self.group
+            ) for i in range(POSTS_PER_PAGE)]
+        )
+        Timeline.objects.bulk_create(
+            [Timeline(user=self.follower, post=post, pub_date=post.pub_date)
+             for post in Post.objects.exclude(pk=self.post.pk)]
+        )
+        cases = [
+            [MAIN_PAGE_URL, 5],
+            [GROUP_URL, 6],
+            [PROFILE_URL, 7],
+            [FOLLOW_INDEX_URL, 5],
+        ]
+        for url, queries in cases:
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    self.follower_client.get(url)
+
+    def test_post_comments_pages(self):
+        """Комментарии идут по дате порциями с авторами в одном запросе."""
+        Comment.objects.bulk_create(
+            [Comment(post=self.post, author=self.follower, text=str(i))
+             for i in range(COMMENTS_PER_PAGE + 1)]
+        )
+        comments = self.client.get(self.POST_DETAIL_URL).context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [str(i) for i in range(COMMENTS_PER_PAGE)]
+        )
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        with self.assertNumQueries(1):
+            response = Client().get(f'{url}?cursor={comments.next_cursor}')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [str(COMMENTS_PER_PAGE)]
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+
     def test_index_cache(self):
         content_one = self.client.get(MAIN_PAGE_URL).content
-        Post.objects.all().delete()
+        # update() не шлёт сигналов, поэтому кеш не сбрасывается
+        Post.objects.update(text=NEW_POST_TEXT)
         content_two = self.client.get(MAIN_PAGE_URL).content
         self.assertEqual(content_one, content_two)
         cache.clear()
         content_three = self.client.get(MAIN_PAGE_URL).content
         self.assertNotEqual(content_one, content_three)
 
+    def test_index_cache_invalidation(self):
+        """Изменение записей сразу сбрасывает кеш главной страницы."""
+        content_one = self.client.get(MAIN_PAGE_URL).content
+        Post.objects.all().delete()
+        content_two = self.client.get(MAIN_PAGE_URL).content
+        self.assertNotEqual(content_one, content_two)
+
     def test_follow(self):
         self.unfollower_client.get(FOLLOW_URL)
         self.assertTrue(
             Follow.objects.filter(user=self.unfollower, author=self.user)
         )
 
+    def test_follow_twice(self):
+        """Повторная подписка ничего не меняет."""
+        stats = UserStats.objects.get(user=self.user)
+        self.follower_client.get(FOLLOW_URL)
+        self.assertEqual(self.follower.follower.count(), 1)
+        stats.refresh_from_db()
+        self.assertEqual(stats.followers_count, 1)
+
     def test_unfollow(self):
         self.follower_client.get(UNFOLLOW_URL)
         self.assertFalse(
             Follow.objects.filter(user=self.unfollower, author=self.user)
         )
+
+    def test_follow_timeline(self):
+        """Лента подписок пополняется при публикации и чистится отпиской."""
+        new_post = Post.objects.create(text=POST_TEXT, author=self.user)
+        self.assertIn(
+            new_post,
+            self.follower_client.get(FOLLOW_INDEX_URL).context['page_obj']
+        )
+        self.follower_client.get(UNFOLLOW_URL)
+        self.assertFalse(Timeline.objects.filter(user=self.follower).exists())
+        response = self.follower_client.get(FOLLOW_INDEX_URL)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_user_stats(self):
+        """Счётчики профиля следуют за записями, подписками и комментариями."""
+        Comment.objects.create(post=self.post, author=self.user, text='1')
+        Post.objects.create(text=POST_TEXT, author=self.user).delete()
+        self.unfollower_client.get(FOLLOW_URL)
+        expected = {
+            'posts_count': 1,
+            'followers_count': 2,
+            'following_count': 0,
+            'comments_count': 1,
+        }
+        stats = self.client.get(PROFILE_URL).context['author_stats']
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+        UserStats.objects.all().delete()
+        call_command('rebuild_user_stats', stdout=StringIO())
+        stats = UserStats.objects.get(user=self.user)
+        for field, value in expected.items():
+            with self.subTest(field=field, rebuilt=True):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_profile_without_stats_reads_only(self):
+        """Профиль без записи счётчиков показывает нули и ничего не пишет."""
+        UserStats.objects.filter(user=self.user).delete()
+        response = self.client.get(PROFILE_URL)
+        self.assertEqual(response.context['author_stats'].posts_count, 0)
+        self.assertFalse(UserStats.objects.filter(user=self.user).exists())
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_imported_users_get_stats(self):
+        """Пользователи, заведённые импортом, сразу получают счётчики."""
+        self.import_file('post', [
+            {'author': 'newcomer', 'group': 'missing', 'text': POST_TEXT},
+        ], '--create-users')
+        self.assertTrue(
+            UserStats.objects.filter(user__username='newcomer').exists()
+        )
+
+    def test_rebuild_timelines(self):
+        """Команда восстанавливает ленты по подпискам."""
+        Timeline.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(Timeline.objects.values_list('user', 'post')),
+            [(self.follower.pk, self.post.pk)]
+        )
+
+    def test_conditional_get(self):
+        """Повторный запрос с валидаторами получает 304 до изменения."""
+        urls = [MAIN_PAGE_URL, GROUP_URL, PROFILE_URL, self.POST_DETAIL_URL]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                last_modified = response['Last-Modified']
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                    304
+                )
+                self.assertEqual(
+                    self.client.get(
+                        url, HTTP_IF_MODIFIED_SINCE=last_modified
+                    ).status_code,
+                    304
+                )
+                self.assertEqual(
+                    self.follower_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag
+                    ).status_code,
+                    200
+                )
+                Comment.objects.create(
+                    post=self.post, author=self.user, text=POST_TEXT
+                )
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                    200
+                )
+
+    def test_search(self):
+        """Поиск находит записи по префиксам слов и следит за изменениями."""
+        rare = Post.objects.create(
+            text='Редкое слово кракозябра', author=self.user
+        )
+        frequent = Post.objects.create(
+            text='кракозябра кракозябра кракозябра', author=self.user
+        )
+        page = self.client.get(SEARCH_URL, {'q': 'кракоз'}).context['page_obj']
+        self.assertEqual(list(page), [frequent, rare])
+        rare.text = 'Обычный текст'
+        rare.save()
+        frequent.delete()
+        page = self.client.get(SEARCH_URL, {'q': 'кракоз'}).context['page_obj']
+        self.assertEqual(list(page), [])
+
+    def test_search_pagination(self):
+        """Результаты поиска листаются курсором без пропусков."""
+        Post.objects.bulk_create(
+            [Post(text=f'{POST_TEXT} {i}', author=self.user)
+             for i in range(POSTS_PER_PAGE)]
+        )
+        search.rebuild()
+        first = self.client.get(
+            SEARCH_URL, {'q': 'тестов'}
+        ).context['page_obj']
+        second = self.client.get(
+            SEARCH_URL, {'q': 'тестов', 'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(first), POSTS_PER_PAGE)
+        self.assertEqual(len(second), 1)
+        self.assertFalse(set(first) & set(second))
+        previous = self.client.get(
+            SEARCH_URL, {'q': 'тестов', 'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous), list(first))
+
+    def test_search_matching(self):
+        """Фильтр поиска (им пользуется админка) находит все совпадения."""
+        Post.objects.bulk_create(
+            [Post(text=f'{POST_TEXT} {i}', author=self.user)
+             for i in range(3)]
+        )
+        search.rebuild()
+        self.assertEqual(
+            search.matching(Post.objects.all(), 'тестов').count(), 4
+        )
+
+    def test_thumbnails(self):
+        """Шаблоны выводят только заранее построенные миниатюры."""
+        cache.clear()
+        self.assertIsNone(thumbnails.lookup(self.post.image, 'card'))
+        # Пока миниатюр нет, выводится исходная картинка.
+        self.assertContains(
+            self.client.get(self.POST_DETAIL_URL), self.post.image.url
+        )
+        version = get_version('index')
+        call_command('generate_thumbnails', stdout=StringIO())
+        self.assertNotEqual(get_version('index'), version)
+        # Без страниц, вышедших без миниатюр, кеш страниц не сбрасывается.
+        version = get_version('index')
+        call_command('generate_thumbnails', stdout=StringIO())
+        self.assertEqual(get_version('index'), version)
+        found = thumbnails.lookup(self.post.image, 'card')
+        self.assertIsNotNone(found)
+        fallback = found['fallback']
+        self.assertEqual((fallback.width, fallback.height), (960, 339))
+        widths = [width for _, width in found['srcsets']['JPEG']]
+        self.assertEqual(widths, [960, 640, 320])
+        response = self.client.get(self.POST_DETAIL_URL)
+        self.assertContains(response, f'{fallback.url} 960w')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_collect_media_garbage(self):
+        """Сборщик удаляет только файлы без ссылок и умеет продолжать."""
+        cache.clear()
+        thumbnails.generate(self.post.image.name)
+        orphans = ['posts/orphan.gif', 'cache/00/00/orphan.jpg']
+        for name in orphans:
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(SMALL_GIF)
+        kept = thumbnails.lookup(self.post.image, 'card')['fallback'].name
+        call_command('collect_media_garbage', '--dry-run', '--min-age=0',
+                     stdout=StringIO())
+        for name in orphans:
+            self.assertTrue(
+                os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name))
+            )
+        runs = 0
+        while True:
+            runs += 1
+            # Курсор хранится в базе и переживает очистку кеша.
+            cache.clear()
+            if garbage.collect(limit=1, min_age=0)['finished']:
+                break
+            self.assertTrue(MediaGarbageCursor.objects.exists())
+        self.assertGreater(runs, 2)
+        self.assertFalse(MediaGarbageCursor.objects.exists())
+        for name in orphans:
+            self.assertFalse(
+                os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name))
+            )
+        for name in (self.post.image.name, kept):
+            self.assertTrue(
+                os.path.exists(os.path.join(TEMP_MEDIA_ROOT, name))
+            )
+
+    def import_file(self, model, rows, *options):
+        path = os.path.join(TEMP_MEDIA_ROOT, f'{model}.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(
+                json.dumps(row, ensure_ascii=False) + '\n' for row in rows
+            )
+        output, errors = StringIO(), StringIO()
+        call_command(
+            'import_content', model, path, '--chunk-size=2', *options,
+            stdout=output, stderr=errors
+        )
+        return output.getvalue(), errors.getvalue()
+
+    def test_import_reports_skipped_rows(self):
+        """Пропущенные строки видны с номером и причиной."""
+        output, errors = self.import_file('group', [
+            {'slug': GROUP_SLUG, 'title': GROUP_TITLE},
+            {'slug': NEW_GROUP_SLUG, 'titel': NEW_GROUP_TITLE},
+            {'slug': NEW_GROUP_SLUG, 'title': NEW_GROUP_TITLE},
+            {'slug': NEW_GROUP_SLUG, 'title': NEW_GROUP_TITLE},
+        ], '--show-errors=2')
+        self.assertIn('создано 1, пропущено 3', output)
+        self.assertEqual(sorted(errors.splitlines()[:2]), [
+            f'Строка 1 пропущена: Группа {GROUP_SLUG} уже есть',
+            "Строка 2 пропущена: Нет поля 'title'",
+        ])
+        self.assertEqual(errors.splitlines()[2:], [
+            'Причины не выведены ещё для 1 строк',
+        ])
+
+    def test_import_content(self):
+        """Импорт сохраняет даты, отсеивает мусор и пересобирает ленты."""
+        self.import_file('group', [
+            {'slug': NEW_GROUP_SLUG, 'title': NEW_GROUP_TITLE},
+        ])
+        self.import_file('post', [
+            {'author': 'imported', 'group': NEW_GROUP_SLUG,
+             'text': 'Импортированная запись',
+             'pub_date': '2001-02-03T04:05:06+00:00'},
+            {'author': USERNAME, 'group': 'missing', 'text': POST_TEXT},
+        ], '--keep-dates', '--create-users')
+        post = Post.objects.get(text='Импортированная запись')
+        self.assertEqual(post.pub_date.year, 2001)
+        self.assertEqual(post.group.slug, NEW_GROUP_SLUG)
+        self.assertFalse(Post.objects.filter(group=None, text=POST_TEXT))
+        self.import_file('comment', [
+            {'post': post.pk, 'author': USERNAME, 'text': 'Комментарий',
+             'created': '2002-03-04T05:06:07+00:00'},
+            {'post': 0, 'author': USERNAME, 'text': 'Комментарий'},
+        ], '--keep-dates')
+        self.assertEqual(post.comments.get().created.year, 2002)
+        # Даты из файла не отключают auto_now_add у полей модели.
+        self.assertTrue(Comment._meta.get_field('created').auto_now_add)
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        self.import_file('follow', [
+            {'user': FOLLOWER_USERNAME, 'author': 'imported'},
+            {'user': FOLLOWER_USERNAME, 'author': 'imported'},
+            {'user': 'imported', 'author': 'imported'},
+        ])
+        self.assertEqual(post.author.following.count(), 1)
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertTrue(Timeline.objects.filter(
+            user=self.follower, post=post
+        ).exists())
+        page = self.client.get(
+            SEARCH_URL, {'q': 'импортированная'}
+        ).context['page_obj']
+        self.assertEqual(list(page), [post])
+
+    def test_import_updates_only_imported_rows(self):
+        """Импорт дополняет ленты и индекс, а не пересобирает их."""
+        # Полная пересборка вернула бы эту запись в ленту.
+        Timeline.objects.filter(post=self.post).delete()
+        self.import_file('post', [
+            {'author': USERNAME, 'text': 'Первая импортированная',
+             'image': self.post.image.name},
+            {'author': USERNAME, 'text': 'Вторая импортированная'},
+            {'author': USERNAME, 'text': 'Третья импортированная',
+             'id': 1000},
+        ])
+        imported = set(Post.objects.exclude(
+            pk=self.post.pk
+        ).values_list('pk', flat=True))
+        self.assertEqual(len(imported), 3)
+        self.assertEqual(set(Timeline.objects.filter(
+            user=self.follower
+        ).values_list('post_id', flat=True)), imported)
+        self.assertEqual({
+            post.pk for post in search.search_page(
+                'импортированная', None, POSTS_PER_PAGE
+            )
+        }, imported)
+        self.assertEqual(
+            StoredImage.objects.get(name=self.post.image.name).references, 2
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).posts_count, 4
+        )
+
+    def test_reimport_export_skips_existing_ids(self):
+        """Повторный импорт выгрузки пропускает занятые id."""
+        path = os.path.join(TEMP_MEDIA_ROOT, 'posts.jsonl')
+        call_command(
+            'export_content', 'post', f'--output={path}', stdout=StringIO()
+        )
+        with open(path, encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        rows.append({'author': USERNAME, 'text': 'Новая', 'id': 2000})
+        rows.append({'author': USERNAME, 'text': 'Дубль', 'id': 2000})
+        self.import_file('post', rows)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Post.objects.get(pk=2000).text, 'Новая')
+        self.assertEqual(Post.objects.get(pk=self.post.pk).text, POST_TEXT)
+
+    def test_export_content(self):
+        """Выгрузка идёт потоком и доступна только персоналу."""
+        Post.objects.bulk_create(
+            [Post(text=f'{POST_TEXT} {i}', author=self.user)
+             for i in range(5)]
+        )
+        export_url = reverse('posts:export', args=['post'])
+        self.assertEqual(self.client.get(export_url).status_code, 302)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        staff_client = Client()
+        staff_client.force_login(staff)
+        response = staff_client.get(export_url, {'gzip': '1'})
+        self.assertTrue(response.streaming)
+        rows = [
+            json.loads(line) for line in gzip.decompress(
+                b''.join(response.streaming_content)
+            ).decode().splitlines()
+        ]
+        self.assertEqual(
+            [row['id'] for row in rows],
+            list(Post.objects.order_by('pk').values_list('pk', flat=True))
+        )
+        self.assertEqual(rows[0]['author'], USERNAME)
+        path = os.path.join(TEMP_MEDIA_ROOT, 'posts.csv')
+        call_command(
+            'export_content', 'post', '--format=csv', '--chunk-size=2',
+            f'--output={path}'
+        )
+        with open(path, encoding='utf-8') as file:
+            lines = file.read().splitlines()
+        self.assertEqual(lines[0], 'id,author,group,text,pub_date,image')
+        self.assertEqual(len(lines), len(rows) + 1)
@@ -0,0 +1,168 @@
+"""Заблаговременная генерация миниатюр картинок записей.
+
+Все размеры, которые выводят шаблоны, описаны в `THUMBNAILS`. После
+сохранения картинки они строятся в фоновом потоке, а шаблоны только
+читают готовые миниатюры из хранилища ключей sorl и никогда не
+запускают декодирование и масштабирование во время запроса. Пока
+миниатюр нет, шаблон выводит исходную картинку и отмечает это, чтобы
+после генерации сбросить кеш страниц — но только в этом случае.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import metrics
+from core.caching import bump_version
+from .conditional import CONTENT
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Набор миниатюр: имя -> размер самого крупного варианта и ширины,
+# из которых браузер выбирает по srcset.
+THUMBNAILS = {
+    'card': ((960, 339), (320, 640, 960)),
+}
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# JPEG — запасной формат для браузеров без поддержки WebP.
+FORMATS = ('WEBP', 'JPEG') if features.check('webp') else ('JPEG',)
+FALLBACK_FORMAT = 'JPEG'
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.THUMBNAIL_WORKERS or 1,
+    thread_name_prefix='thumbnails'
+)
+
+
+def _thumbnail_name(source, geometry, options):
+    # Повторяет подготовку опций из ThumbnailBackend.get_thumbnail,
+    # чтобы получить то же имя файла, не трогая картинку.
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return backend._get_thumbnail_filename(source, geometry, options)
+
+
+def variants(name):
+    """Тройки (формат, ширина, геометрия) набора, крупные первыми."""
+    (width, height), widths = THUMBNAILS[name]
+    return [
+        (image_format, size, f'{size}x{round(size * height / width)}')
+        for image_format in FORMATS
+        for size in sorted(widths, reverse=True)
+    ]
+
+
+def _lookup_variant(source, image_format, geometry):
+    options = dict(THUMBNAIL_OPTIONS, format=image_format)
+    return default.kvstore.get(ImageFile(
+        _thumbnail_name(source, geometry, options), default.storage
+    ))
+
+
+def lookup(image, name):
+    """Готовые варианты миниатюры из хранилища ключей (без генерации).
+
+    Возвращает словарь с крупнейшим JPEG (`fallback`) и списками
+    `(миниатюра, ширина)` по форматам (`srcsets`) или None, если
+    миниатюры ещё не построены.
+    """
+    if not image:
+        return None
+    source = ImageFile(image)
+    srcsets = {}
+    fallback = None
+    # Сначала ищем крупнейший запасной вариант: если его нет, картинку
+    # ещё не обработали, и остальные варианты искать незачем.
+    ordered = sorted(
+        variants(name), key=lambda variant: variant[0] != FALLBACK_FORMAT
+    )
+    for image_format, width, geometry in ordered:
+        thumbnail = _lookup_variant(source, image_format, geometry)
+        if thumbnail is None:
+            if fallback is None:
+                return None
+            continue
+        if fallback is None:
+            fallback = thumbnail
+        srcsets.setdefault(image_format, []).append((thumbnail, width))
+    return {'fallback': fallback, 'srcsets': srcsets}
+
+
+def generate(name):
+    """Строит все миниатюры картинки, пропуская уже готовые."""
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    for thumbnail_set in THUMBNAILS:
+        with metrics.timer(
+            'yatube_thumbnail_generation_seconds', (('set', thumbnail_set),)
+        ):
+            for image_format, width, geometry in variants(thumbnail_set):
+                get_thumbnail(
+                    source, geometry, format=image_format,
+                    **THUMBNAIL_OPTIONS
+                )
+
+
+def _missing_key(name):
+    return f'thumbnails:missing:{name}'
+
+
+def note_missing(image):
+    """Отмечает, что страница вышла с исходной картинкой без миниатюр."""
+    # Дольше CACHE_TIME такая страница в кеше не проживёт.
+    cache.set(_missing_key(image.name), True, settings.CACHE_TIME)
+
+
+def refresh_pages(name):
+    """После генерации сбрасывает кеш страниц, если они вышли без миниатюр."""
+    key = _missing_key(name)
+    if cache.get(key):
+        cache.delete(key)
+        bump_version('index', CONTENT)
+
+
+def _build(name):
+    try:
+        generate(name)
+        refresh_pages(name)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+
+
+def _generate_in_background(name):
+    try:
+        _build(name)
+    finally:
+        connections.close_all()
+
+
+def schedule(image):
+    """Ставит генерацию миниатюр в фон после фиксации транзакции.
+
+    При `THUMBNAIL_WORKERS = 0` миниатюры строятся сразу после фиксации в
+    том же потоке.
+    """
+    if not image:
+        return
+    name = image.name
+    if not settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: _build(name))
+        return
+    transaction.on_commit(
+        lambda: _executor.submit(_generate_in_background, name)
+    )
@@ -0,0 +1,73 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Каждая запись автора копируется в ленты его подписчиков в момент
+публикации, поэтому чтение `/follow/` сводится к выборке по индексу
+`(user, -pub_date)` одной таблицы.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Follow, Post, Timeline
+
+BATCH_SIZE = 500
+
+
+def _insert(entries):
+    Timeline.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    """Доставляет новую запись в ленты всех подписчиков автора."""
+    _insert(
+        Timeline(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in Follow.objects.filter(
+            author_id=post.author_id
+        ).values_list('user_id', flat=True).iterator()
+    )
+
+
+def fan_out_many(post_ids):
+    """Как `fan_out`, но сразу для многих записей (после импорта)."""
+    posts = defaultdict(list)
+    for post_id, author_id, pub_date in Post.objects.filter(
+        pk__in=post_ids
+    ).values_list('id', 'author_id', 'pub_date'):
+        posts[author_id].append((post_id, pub_date))
+    _insert(
+        Timeline(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id, author_id in Follow.objects.filter(
+            author_id__in=posts
+        ).values_list('user_id', 'author_id').iterator()
+        for post_id, pub_date in posts[author_id]
+    )
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту читателя записями автора после подписки."""
+    _insert(
+        Timeline(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in Post.objects.filter(
+            author_id=author_id
+        ).values_list('id', 'pub_date').iterator()
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает записи автора из ленты читателя после отписки."""
+    Timeline.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id
+    ).delete()
+
+
+@transaction.atomic
+def rebuild():
+    """Полностью пересобирает ленты по таблице подписок."""
+    Timeline.objects.all().delete()
+    for user_id, author_id in Follow.objects.values_list(
+        'user_id', 'author_id'
+    ).iterator():
+        backfill(user_id, author_id)
@@ -17,12 +17,21 @@ urlpatterns = [
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/edit/',
          views.post_edit,
          name='post_edit'),
     path('posts/<int:post_id>/',
          views.post_detail,
          name='post_detail'),
+    path('search/',
+         views.post_search,
+         name='search'),
+    path('export/<str:model>/',
+         views.export,
+         name='export'),
     path('create/',
          views.post_create,
          name='post_create'),
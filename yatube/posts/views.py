@@ -1,41 +1,59 @@
-from django.core.paginator import Paginator
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.db import IntegrityError, transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import (
     get_object_or_404,
     render,
     redirect
 )
 
-from yatube.settings import POSTS_PER_PAGE, CACHE_TIME
+from core.caching import get_version, versioned_cache_page
+from yatube.settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE, CACHE_TIME
+from . import exporting, search, stats
+from .conditional import (
+    conditional, group_scope, index_scope, post_scope, profile_scope
+)
 from .forms import PostForm, CommentForm
-from .models import Follow, Post, Group, User
+from .models import Comment, Follow, Post, Group, User
+from .pagination import CursorPaginator
 
 
 def get_page_obj(posts, request):
-    return Paginator(posts, POSTS_PER_PAGE).get_page(request.GET.get('page'))
+    paginator = CursorPaginator(posts, POSTS_PER_PAGE)
+    if 'cursor' in request.GET:
+        return paginator.cursor_page(request.GET['cursor'])
+    return paginator.get_page(request.GET.get('page'))
 
 
-@cache_page(CACHE_TIME, key_prefix='index_page')
+@conditional(index_scope)
+@versioned_cache_page(CACHE_TIME, 'index')
 def index(request):
     return render(request, 'posts/index.html', {
-        'page_obj': get_page_obj(Post.objects.all(), request)
+        'page_obj': get_page_obj(Post.objects.for_cards(), request),
+        'index_version': get_version('index')
     })
 
 
+@conditional(group_scope)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
         'group': group,
-        'page_obj': get_page_obj(group.posts.all(), request)
+        'page_obj': get_page_obj(group.posts.for_cards(), request)
     })
 
 
+@conditional(profile_scope)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
     return render(request, 'posts/profile.html', {
         'author': author,
-        'page_obj': get_page_obj(author.posts.all(), request),
+        'author_stats': stats.get(author),
+        'page_obj': get_page_obj(author.posts.for_cards(), request),
         'following': (
             request.user.is_authenticated
             and author != request.user
@@ -44,14 +62,50 @@ def profile(request, username):
     })
 
 
+def get_comments_page(post_id, request):
+    return CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related(
+            'author'
+        ).only('text', 'created', 'author__username'),
+        COMMENTS_PER_PAGE,
+        keys=('created', 'id'),
+        descending=False
+    ).cursor_page(request.GET.get('cursor'))
+
+
+@conditional(post_scope)
 def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.for_cards().select_related('author__stats'),
+        pk=post_id
+    )
     return render(request, 'posts/post_detail.html', {
-        'post': get_object_or_404(Post, pk=post_id),
+        'post': post,
+        'author_stats': stats.get(post.author),
+        'comments': get_comments_page(post.pk, request),
         'form': CommentForm(request.POST or None)
     })
 
 
+def post_comments(request, post_id):
+    return render(request, 'posts/includes/comments.html', {
+        'post_id': post_id,
+        'comments': get_comments_page(post_id, request)
+    })
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': search.search_page(
+            query, request.GET.get('cursor'), POSTS_PER_PAGE
+        )
+    })
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
@@ -83,6 +137,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -96,32 +151,56 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    return render(request, 'posts/follow.html', {
-        'page_obj': get_page_obj(
-            Post.objects.filter(author__following__user=request.user),
-            request
-        )
-    })
+    page_obj = get_page_obj(
+        request.user.timeline.only('user', 'post', 'pub_date'),
+        request
+    )
+    posts = Post.objects.for_cards().in_bulk(
+        [entry.post_id for entry in page_obj]
+    )
+    page_obj.object_list = [posts[entry.post_id] for entry in page_obj]
+    return render(request, 'posts/follow.html', {'page_obj': page_obj})
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if (
-        (author != request.user)
-        and not request.user.follower.filter(author=author).exists()
-    ):
-        Follow.objects.create(
-            user=request.user,
-            author=author
-        )
+    if author != request.user:
+        # Повторную подписку отсекает уникальное ограничение: один INSERT
+        # вместо проверки exists(), без гонки между проверкой и вставкой.
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            pass
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     get_object_or_404(
         request.user.follower,
         author__username=username
     ).delete()
     return redirect('posts:profile', username=username)
+
+
+@staff_member_required
+def export(request, model):
+    file_format = request.GET.get('format', 'jsonl')
+    if model not in exporting.EXPORTS or file_format not in exporting.FORMATS:
+        raise Http404
+    compress = 'gzip' in request.GET
+    filename = f'{model}s.{file_format}' + ('.gz' if compress else '')
+    response = StreamingHttpResponse(
+        exporting.encode(exporting.lines(model, file_format), compress),
+        content_type=(
+            'application/gzip' if compress
+            else f'text/{"csv" if file_format == "csv" else "plain"}; '
+                 f'charset=utf-8'
+        )
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -27,11 +28,15 @@ DEBUG = True
 
 ALLOWED_HOSTS = ['*']
 
+# Идёт прогон тестов (manage.py test или pytest).
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 
 # Application definition
 
 INSTALLED_APPS = [
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'core.apps.CoreConfig',
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
@@ -45,6 +50,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestStatsMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QuerySourceMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,13 +61,15 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Стандартный бэкенд, который ещё и замеряет время отрисовки.
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,9 +97,55 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, а не открывается на каждый.
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            # Сколько ждать чужой блокировки записи: драйвер sqlite3 сам
+            # выставляет из этого значения PRAGMA busy_timeout.
+            'timeout': 20,
+        },
     }
 }
 
+# Выполняются на каждом новом соединении SQLite (см. core/db.py).
+# busy_timeout здесь не задаём: его задаёт OPTIONS['timeout'] выше.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+# Проверять постоянное соединение в начале каждого запроса.
+DATABASE_HEALTH_CHECKS = True
+
+# Реплики только для чтения: пути к копиям базы через os.pathsep,
+# например YATUBE_REPLICAS=/srv/replica1.sqlite3:/srv/replica2.sqlite3.
+# Копии обновляет команда sync_replicas.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('YATUBE_REPLICAS', '').split(os.pathsep)),
+    start=1
+):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Представления, которые читают с реплик.
+REPLICA_READ_VIEWS = {
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+}
+# Сколько секунд после своей записи пользователь читает с основной базы.
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'primary_until'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -137,15 +194,130 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+# Наибольший размер страницы, который клиент API может запросить limit.
+API_MAX_PAGE_SIZE = 100
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загруженные картинки уменьшаются до POST_IMAGE_MAX_SIDE по большей
+# стороне и пересохраняются с качеством POST_IMAGE_QUALITY; картинки
+# больше POST_IMAGE_MAX_PIXELS отклоняются до декодирования.
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_QUALITY = 85
+
+# Потоки, в которых строятся миниатюры загруженных картинок; 0 — строить
+# сразу после фиксации транзакции в том же потоке. Так в тестах: фоновый
+# поток иначе сталкивается с очисткой тестовой базы.
+THUMBNAIL_WORKERS = 0 if TESTING else 2
+
+# L1 в памяти каждого воркера перед общим для всех воркеров L2.
+# В продакшене 'shared' можно направить на Redis, не трогая 'default'.
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 300,
+            'L1_TIMEOUT': 5,
+            'GENERATION_INTERVAL': 0.5,
+        },
+    },
+    # Кеш тега {% cache %}: то же хранилище, но с учётом попаданий.
+    'template_fragments': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 300,
+            'L1_TIMEOUT': 5,
+            'GENERATION_INTERVAL': 0.5,
+            'METRICS_LABEL': 'fragment',
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'shared.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+if TESTING:
+    # Тесты очищают кеш; файл общего кеша рабочего сервера не трогаем.
+    CACHES['shared'] = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
-}
-CACHE_TIME = 20
+CACHE_TIME = 60 * 60
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Доля запросов, для которых собирается статистика (core/stats.py).
+REQUEST_STATS_SAMPLE_RATE = 0.05
+# Запросы дольше этого (в мс) пишутся в лог всегда.
+REQUEST_STATS_SLOW_MS = 1000
+# Сколько самых долгих SQL-запросов показывать у медленного запроса.
+REQUEST_STATS_TOP_QUERIES = 5
+
+# Представления этих приложений попадают в метрики (core/metrics.py).
+METRICS_NAMESPACES = {'posts', 'users', 'about', 'core'}
+# Каталог, через который воркеры складывают метрики; без него каждый
+# процесс отдаёт только свои. Очищать при перезапуске сервиса.
+METRICS_DIR = os.environ.get('YATUBE_METRICS_DIR')
+# Как часто (в секундах) процесс сбрасывает метрики в METRICS_DIR.
+METRICS_FLUSH_INTERVAL = 1
+
+# Куда сохранять профили запросов с ?profile=1 (core/profiling.py).
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+# Сколько строк cProfile и tracemalloc попадает в сводку.
+PROFILE_TOP_ENTRIES = 40
+
+# Запросы к базе дольше этого (в мс) пишутся в SLOW_QUERY_LOG
+# (core/slow_queries.py); сводка — manage.py slow_queries.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+        'message': {
+            'format': '%(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'plain',
+        },
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        # DEBUG покажет итог каждого запроса из выборки.
+        'core.stats': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
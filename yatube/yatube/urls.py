@@ -12,6 +12,10 @@ urlpatterns = [
          include('django.contrib.auth.urls')),
     path('about/',
          include('about.urls', namespace='about')),
+    path('api/',
+         include('api.urls', namespace='api')),
+    path('',
+         include('core.urls', namespace='core')),
     path('',
          include('posts.urls', namespace='posts'))
 ]